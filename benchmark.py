@@ -0,0 +1,280 @@
+"""Offline end-to-end benchmark against local provider stand-ins (no network, no API keys).
+
+    python benchmark.py --target async --reports 40 --concurrency 8
+    python benchmark.py --target api --json results.json
+    python benchmark.py --baseline baseline.json --max-regression 0.15   # exits 1 on regression
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from stub_providers import DEFAULT_PROFILES, StubProviders
+
+SAMPLE_REPORT = """There is horizontal tear of the medial meniscal posterior horn with displaced flap within the medial knee gutter. Heterogenous signal of the ACL, likely partial tear. Moderate medial tibiofemoral chondropathy, 1.5cm width, partial thickness. Small joint effusion. No other significant findings."""
+
+# Summary fields compared against a baseline: name -> True if higher is better
+COMPARED_FIELDS = {
+    'throughput_rps': True,
+    'p50_seconds': False,
+    'p95_seconds': False,
+    'p99_seconds': False
+}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of latencies"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(round(fraction * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024
+
+
+def configure_pipeline(ai, stubs: StubProviders, args: argparse.Namespace):
+    """Point a pipeline at the stubs and apply benchmark settings"""
+    stubs.configure(ai)
+    if not args.cache:
+        # Measure the uncached pipeline: every report pays for its provider calls, so no cache,
+        # guideline corpus or stored report results may answer in their place
+        ai._close_caches()
+        ai.evidence_cache = None
+        ai.llm_cache = None
+        ai.report_store = None
+        ai.corpus = None
+    ai.batched_recommendations = args.batched
+    ai.local_first = args.local_first
+    if args.no_rate_limit:
+        ai.scheduler.quotas = {provider: quota._replace(requests_per_second=0)
+                               for provider, quota in ai.scheduler.quotas.items()}
+
+
+def _timed_call(fn: Callable[[], Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        fn()
+        return {'seconds': time.perf_counter() - started, 'ok': True}
+    except Exception as e:
+        return {'seconds': time.perf_counter() - started, 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+
+
+async def _timed_call_async(coro) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        await coro
+        return {'seconds': time.perf_counter() - started, 'ok': True}
+    except Exception as e:
+        return {'seconds': time.perf_counter() - started, 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+
+
+def run_sync(stubs: StubProviders, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Drive RadiologyClinicalAI.generate_report from a thread pool"""
+    from radiology_ai import RadiologyClinicalAI
+
+    ai = RadiologyClinicalAI()
+    configure_pipeline(ai, stubs, args)
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            return list(executor.map(
+                lambda _: _timed_call(lambda: ai.generate_report(SAMPLE_REPORT)),
+                range(args.reports)
+            ))
+    finally:
+        ai.close()
+
+
+async def _run_async(stubs: StubProviders, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from radiology_ai_async import AsyncRadiologyClinicalAI
+
+    ai = AsyncRadiologyClinicalAI()
+    configure_pipeline(ai, stubs, args)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one() -> Dict[str, Any]:
+        async with semaphore:
+            return await _timed_call_async(ai.generate_report(SAMPLE_REPORT))
+
+    try:
+        return await asyncio.gather(*(one() for _ in range(args.reports)))
+    finally:
+        await ai.aclose()
+
+
+async def _run_api(stubs: StubProviders, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import httpx
+    import main
+
+    configure_pipeline(main.ai, stubs, args)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+        async def one() -> Dict[str, Any]:
+            async def post():
+                response = await client.post('/analyze', json={'report_text': SAMPLE_REPORT})
+                response.raise_for_status()
+            async with semaphore:
+                return await _timed_call_async(post())
+
+        try:
+            return await asyncio.gather(*(one() for _ in range(args.reports)))
+        finally:
+            await main.ai.aclose()
+
+
+TARGETS = {
+    'sync': run_sync,
+    'async': lambda stubs, args: asyncio.run(_run_async(stubs, args)),
+    'api': lambda stubs, args: asyncio.run(_run_api(stubs, args))
+}
+
+
+def summarize(samples: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Throughput, latency percentiles and error count for one run"""
+    latencies = [sample['seconds'] for sample in samples if sample['ok']]
+    errors = [sample['error'] for sample in samples if not sample['ok']]
+    return {
+        'reports': len(samples),
+        'completed': len(latencies),
+        'errors': len(errors),
+        'error_examples': sorted(set(errors))[:3],
+        'wall_seconds': wall_seconds,
+        'throughput_rps': len(latencies) / wall_seconds if wall_seconds else 0.0,
+        'mean_seconds': statistics.mean(latencies) if latencies else 0.0,
+        'p50_seconds': percentile(latencies, 0.50),
+        'p95_seconds': percentile(latencies, 0.95),
+        'p99_seconds': percentile(latencies, 0.99),
+        'max_seconds': max(latencies) if latencies else 0.0
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Fields that regressed by more than max_regression (a fraction) against the baseline"""
+    regressions = []
+    for field, higher_is_better in COMPARED_FIELDS.items():
+        old, new = baseline['summary'].get(field), result['summary'].get(field)
+        if not old or new is None:
+            continue
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > max_regression:
+            regressions.append(f"{field}: {old:.3f} -> {new:.3f} ({change:+.0%} worse)")
+    return regressions
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Start the stubs, drive the chosen target and collect the results"""
+    profiles = {
+        provider: DEFAULT_PROFILES[provider]._replace(
+            latency=DEFAULT_PROFILES[provider].latency * args.latency_scale,
+            jitter=DEFAULT_PROFILES[provider].jitter * args.latency_scale,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            payload_bytes=args.payload_bytes or DEFAULT_PROFILES[provider].payload_bytes
+        )
+        for provider in DEFAULT_PROFILES
+    }
+
+    with StubProviders(profiles, results_per_query=args.results_per_query,
+                       findings_per_report=args.findings, seed=args.seed) as stubs:
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        started = time.perf_counter()
+        with output:
+            samples = TARGETS[args.target](stubs, args)
+        wall_seconds = time.perf_counter() - started
+
+        memory = {'peak_rss_mb': peak_rss_mb()}
+        if args.tracemalloc:
+            memory['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+
+        return {
+            'config': {key: value for key, value in vars(args).items() if key not in ('json', 'baseline')},
+            'summary': summarize(samples, wall_seconds),
+            'memory': memory,
+            'providers': stubs.stats()
+        }
+
+
+def print_result(result: Dict[str, Any]):
+    summary = result['summary']
+    config = result['config']
+    print(f"📊 {config['target']}: {summary['completed']}/{summary['reports']} reports, "
+          f"concurrency {config['concurrency']}, {summary['wall_seconds']:.2f}s wall")
+    print(f"   throughput  {summary['throughput_rps']:.2f} reports/s")
+    print(f"   latency     p50 {summary['p50_seconds']:.3f}s  p95 {summary['p95_seconds']:.3f}s  "
+          f"p99 {summary['p99_seconds']:.3f}s  max {summary['max_seconds']:.3f}s")
+    print(f"   memory      " + '  '.join(f"{key} {value:.1f}" for key, value in result['memory'].items()))
+    print(f"   provider calls  " + '  '.join(f"{key}={value}" for key, value in result['providers']['calls'].items()))
+    if summary['errors']:
+        print(f"   ⚠️  {summary['errors']} failed: {'; '.join(summary['error_examples'])}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=sorted(TARGETS), default='async',
+                        help='sync generate_report, async generate_report, or the /analyze endpoint')
+    parser.add_argument('--reports', type=int, default=20, help='reports to analyse')
+    parser.add_argument('--concurrency', type=int, default=4, help='reports in flight at once')
+    parser.add_argument('--findings', type=int, default=4, help='findings the stub LLMs extract per report')
+    parser.add_argument('--results-per-query', type=int, default=5, help='results per stub search')
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='multiplier on stub latencies')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of provider calls failing with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of provider calls failing with 429')
+    parser.add_argument('--payload-bytes', type=int, default=0, help='override text size per result/generation')
+    parser.add_argument('--seed', type=int, default=0, help='seed for stub latency and failure draws')
+    parser.add_argument('--cache', action='store_true', help='keep the caches, report store and guideline corpus enabled')
+    parser.add_argument('--batched', action='store_true', help='enable batched recommendations')
+    parser.add_argument('--local-first', action='store_true', help='enable local-first finding extraction')
+    parser.add_argument('--no-rate-limit', action='store_true', help='disable the provider quota scheduler')
+    parser.add_argument('--tracemalloc', action='store_true', help='also report traced Python heap peak (slower)')
+    parser.add_argument('--verbose', action='store_true', help='show pipeline output')
+    parser.add_argument('--json', help='write the full result to this file')
+    parser.add_argument('--baseline', help='baseline result JSON to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='allowed fractional regression against the baseline')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    result = run_benchmark(args)
+    print_result(result)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.max_regression)
+        if regressions:
+            print("❌ Regressed against baseline:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print("✅ Within baseline tolerance")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
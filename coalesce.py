@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class SingleFlight:
+    """Coalesce concurrent identical operations: one caller runs it, the rest share its outcome.
+
+    Keys identify the operation; a call made while the same key is in flight
+    waits for that call instead of starting another. Results and exceptions
+    reach every waiter. Nothing is remembered once the call completes, so this
+    complements the caches rather than replacing them.
+    """
+
+    def __init__(self, on_coalesced: Optional[Callable[[], None]] = None):
+        self.on_coalesced = on_coalesced
+        self.coalesced = 0
+
+        self._calls: Dict[str, Future] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    def _count_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+        if self.on_coalesced is not None:
+            self.on_coalesced()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn, or wait for the identical call already running in another thread"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            self._count_coalesced()
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), or the identical call already running on this event loop"""
+        task = self._tasks.get(key)
+        if task is None:
+            # A separate task, so one waiter being cancelled does not cancel the others
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finish_task(key, done))
+        else:
+            self._count_coalesced()
+        return await asyncio.shield(task)
+
+    def _finish_task(self, key: str, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark the exception retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
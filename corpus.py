@@ -0,0 +1,275 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from findings import SIGNIFICANT_TERMS, finding_terms
+from result_index import canonicalize_url
+
+CORPUS_FORMAT = 1
+
+# BM25 term-frequency saturation and length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# One posting: document id (uint32) and term frequency (uint16), little-endian
+_POSTING = struct.Struct('<IH')
+
+_INDEX_FILE = 'index.json'
+_POSTINGS_FILE = 'postings.bin'
+_DOCUMENTS_FILE = 'documents.jsonl'
+
+
+def _document_terms(document: Dict[str, Any]) -> List[str]:
+    """Indexed terms: title, content and the findings the document was retrieved for"""
+    text = ' '.join([document.get('title') or '', document.get('content') or ''] + document.get('findings', []))
+    return finding_terms(text)
+
+
+def _map(path: str) -> Optional[mmap.mmap]:
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class GuidelineCorpus:
+    """Read-only BM25 index over guideline search results, memory-mapped from disk.
+
+    The term dictionary and per-document statistics are loaded into memory;
+    postings and document bodies stay in mapped files and are paged in on demand.
+    Build or refresh a corpus with build() or the warm-up command.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, _INDEX_FILE), encoding='utf-8') as f:
+            header = json.load(f)
+        if header.get('format') != CORPUS_FORMAT:
+            raise ValueError(f"Unsupported corpus format: {header.get('format')}")
+
+        self.built_at: float = header['built_at']
+        self.avg_length: float = header['avg_length']
+        self._terms: Dict[str, List[int]] = header['terms']              # term -> [first posting, count]
+        self._doc_offsets: List[List[int]] = header['doc_offsets']       # doc id -> [offset, length]
+        self._doc_lengths: List[int] = header['doc_lengths']
+        self._doc_fetched_at: List[float] = header['doc_fetched_at']
+
+        self._postings = _map(os.path.join(directory, _POSTINGS_FILE))
+        self._documents = _map(os.path.join(directory, _DOCUMENTS_FILE))
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional['GuidelineCorpus']:
+        """Open a built corpus, or None if there is none (or it cannot be read)"""
+        if not os.path.exists(os.path.join(directory, _INDEX_FILE)):
+            return None
+        try:
+            return cls(directory)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Guideline corpus unavailable: {str(e)}")
+            return None
+
+    def close(self):
+        """Unmap the corpus files"""
+        for mapped in (self._postings, self._documents):
+            if mapped is not None:
+                mapped.close()
+
+    def document(self, doc_id: int) -> Dict[str, Any]:
+        """Stored document by id"""
+        offset, length = self._doc_offsets[doc_id]
+        return json.loads(self._documents[offset:offset + length])
+
+    def _postings_for(self, term: str) -> Iterable[Tuple[int, int]]:
+        entry = self._terms.get(term)
+        if entry is None:
+            return ()
+        start, count = entry
+        return _POSTING.iter_unpack(self._postings[start * _POSTING.size:(start + count) * _POSTING.size])
+
+    def _idf(self, document_frequency: int) -> float:
+        return math.log(1 + (len(self) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(self, text: str, limit: int = 10) -> List[Tuple[float, float, int]]:
+        """Top documents for free text as (BM25 score, matched share of query IDF, doc id), best first"""
+        terms = set(finding_terms(text))
+        if not terms or not len(self):
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, float] = defaultdict(float)
+        total_idf = 0.0
+        for term in terms:
+            entry = self._terms.get(term)
+            idf = self._idf(entry[1] if entry else 0)
+            total_idf += idf
+            for doc_id, frequency in self._postings_for(term):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                matched[doc_id] += idf
+
+        ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [(scores[doc_id], matched[doc_id] / total_idf, doc_id) for doc_id in ranked]
+
+    def evidence(self, finding: str, min_match: float = 0.6, min_documents: int = 5,
+                 max_age_seconds: float = 30 * 24 * 3600, limit: int = 15) -> Tuple[str, List[Dict[str, Any]]]:
+        """('hit', results) when enough fresh documents match the finding, else ('miss' or 'stale', [])
+
+        A document matches when it contains terms carrying at least min_match of
+        the finding's IDF weight; matches older than max_age_seconds are stale.
+        """
+        cutoff = time.time() - max_age_seconds
+        fresh = []
+        stale = 0
+        for _, match, doc_id in self.search(finding, limit=limit):
+            if match < min_match:
+                continue
+            if self._doc_fetched_at[doc_id] < cutoff:
+                stale += 1
+                continue
+            fresh.append(doc_id)
+
+        if len(fresh) < min_documents:
+            return ('stale' if stale else 'miss'), []
+
+        results = []
+        for doc_id in fresh:
+            document = self.document(doc_id)
+            results.append({key: document[key] for key in ('title', 'url', 'content', 'score') if key in document})
+        return 'hit', results
+
+    def documents(self) -> Iterable[Dict[str, Any]]:
+        """Every stored document"""
+        for doc_id in range(len(self)):
+            yield self.document(doc_id)
+
+    @staticmethod
+    def build(directory: str, documents: Iterable[Dict[str, Any]]):
+        """Write a corpus for the given documents, replacing any existing one atomically per file"""
+        os.makedirs(directory, exist_ok=True)
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        doc_offsets, doc_lengths, doc_fetched_at = [], [], []
+
+        documents_path = os.path.join(directory, _DOCUMENTS_FILE)
+        with open(documents_path + '.tmp', 'wb') as f:
+            for doc_id, document in enumerate(documents):
+                encoded = json.dumps(document).encode('utf-8')
+                doc_offsets.append([f.tell(), len(encoded)])
+                f.write(encoded + b'\n')
+
+                terms = Counter(_document_terms(document))
+                doc_lengths.append(sum(terms.values()))
+                doc_fetched_at.append(document.get('fetched_at', 0.0))
+                for term, frequency in terms.items():
+                    postings[term].append((doc_id, min(frequency, 0xFFFF)))
+
+        terms_header = {}
+        postings_path = os.path.join(directory, _POSTINGS_FILE)
+        with open(postings_path + '.tmp', 'wb') as f:
+            position = 0
+            for term in sorted(postings):
+                entries = postings[term]
+                terms_header[term] = [position, len(entries)]
+                f.write(b''.join(_POSTING.pack(doc_id, frequency) for doc_id, frequency in entries))
+                position += len(entries)
+
+        header = {
+            'format': CORPUS_FORMAT,
+            'built_at': time.time(),
+            'avg_length': (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0,
+            'terms': terms_header,
+            'doc_offsets': doc_offsets,
+            'doc_lengths': doc_lengths,
+            'doc_fetched_at': doc_fetched_at
+        }
+        index_path = os.path.join(directory, _INDEX_FILE)
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(header, f)
+
+        # Replace the index last so readers never pair a new index with old data files
+        os.replace(documents_path + '.tmp', documents_path)
+        os.replace(postings_path + '.tmp', postings_path)
+        os.replace(index_path + '.tmp', index_path)
+
+
+def warm_up(ai, findings: List[str], directory: str, max_age_seconds: float = 30 * 24 * 3600) -> int:
+    """Search each finding live and merge the results into the corpus at directory; returns its size"""
+    documents: Dict[str, Dict[str, Any]] = {}
+    cutoff = time.time() - max_age_seconds
+    existing = GuidelineCorpus.load(directory)
+    if existing is not None:
+        for document in existing.documents():
+            if document.get('fetched_at', 0.0) >= cutoff:
+                documents[canonicalize_url(document['url'])] = document
+        existing.close()
+
+    # Fresh results only: neither the corpus nor the evidence cache may answer
+    for store in (ai.corpus, ai.evidence_cache):
+        if store is not None:
+            store.close()
+    ai.corpus = None
+    ai.evidence_cache = None
+
+    def search(item):
+        index, finding = item
+        print(f"🔥 Warming {index}/{len(findings)}: {finding}")
+        return finding, ai.search_clinical_evidence(finding)
+
+    with ThreadPoolExecutor(max_workers=max(1, ai.max_concurrent_findings)) as executor:
+        searched = list(executor.map(search, enumerate(findings, 1)))
+
+    fetched_at = time.time()
+    for finding, evidence in searched:
+        for result in evidence['results']:
+            key = canonicalize_url(result.get('url') or '')
+            if not key:
+                continue
+            previous = documents.get(key, {})
+            documents[key] = {
+                'title': result.get('title', ''),
+                'url': result['url'],
+                'content': result.get('content', ''),
+                'score': result.get('score', 0.5),
+                'fetched_at': fetched_at,
+                'findings': sorted(set(previous.get('findings', [])) | {finding})
+            }
+
+    GuidelineCorpus.build(directory, documents.values())
+    return len(documents)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build or refresh the local guideline corpus")
+    parser.add_argument('--findings-file', help='findings to warm, one per line (default: SIGNIFICANT_TERMS)')
+    parser.add_argument('--corpus-dir', help='corpus location (default: the pipeline corpus_dir)')
+    args = parser.parse_args(argv)
+
+    from radiology_ai import RadiologyClinicalAI
+
+    if args.findings_file:
+        with open(args.findings_file, encoding='utf-8') as f:
+            findings = [line.strip() for line in f if line.strip()]
+    else:
+        findings = list(SIGNIFICANT_TERMS)
+
+    ai = RadiologyClinicalAI()
+    directory = args.corpus_dir or ai.corpus_dir
+    try:
+        size = warm_up(ai, findings, directory, ai.corpus_max_age_seconds)
+    finally:
+        ai.close()
+    print(f"✅ Guideline corpus at {directory}: {size} documents from {len(findings)} findings")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,96 @@
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+
+class DomainInfo(NamedTuple):
+    priority: int          # Ranking weight used by prioritize_sources
+    label: str             # Human-readable source type for reports
+    tier: Optional[str]    # Guideline tier counted by format_evidence_strength
+
+
+# Evidence tiers recognised by format_evidence_strength
+NICE = 'nice'
+NHS = 'nhs'
+UK_GUIDELINE = 'uk_guideline'
+COCHRANE = 'cochrane'
+EUROPEAN_GUIDELINE = 'european_guideline'
+AMERICAN_GUIDELINE = 'american_guideline'
+HIGH_IMPACT_JOURNAL = 'high_impact_journal'
+
+UNKNOWN_SOURCE = DomainInfo(1, 'Clinical Source', None)
+
+# Registered domains; a host matches its longest registered suffix
+DOMAIN_REGISTRY = {
+    # Tier 1: UK National Guidelines (Highest Priority)
+    'nice.org.uk': DomainInfo(100, 'NICE Guideline (UK National)', NICE),
+    'nhs.uk': DomainInfo(95, 'NHS Guidance (UK National)', NHS),
+    'nhsengland.nhs.uk': DomainInfo(90, 'NHS Guidance (UK National)', NHS),
+    'sign.ac.uk': DomainInfo(85, 'SIGN Guideline (Scottish)', UK_GUIDELINE),  # Scottish Intercollegiate Guidelines Network
+    'gov.uk': DomainInfo(80, 'UK Government Guidance', None),
+
+    # Tier 2: UK Professional Bodies
+    'rcr.ac.uk': DomainInfo(75, 'Royal College of Radiologists (UK)', UK_GUIDELINE),
+    'boa.ac.uk': DomainInfo(70, 'British Orthopaedic Association', UK_GUIDELINE),
+    'bssr.org.uk': DomainInfo(65, 'British Society of Skeletal Radiology', None),
+
+    # Tier 3: European Guidelines
+    'eular.org': DomainInfo(60, 'EULAR Guidelines (European)', EUROPEAN_GUIDELINE),
+    'myesr.org': DomainInfo(58, 'European Society of Radiology', EUROPEAN_GUIDELINE),
+    'essr.org': DomainInfo(55, 'European Society of MSK Radiology', EUROPEAN_GUIDELINE),
+    'esska.org': DomainInfo(52, 'European Society Sports/Knee/Arthroscopy', None),
+    'eurospine.org': DomainInfo(50, 'Clinical Source', None),
+
+    # Tier 4: American Guidelines
+    'acr.org': DomainInfo(48, 'American College of Radiology', AMERICAN_GUIDELINE),
+    'aaos.org': DomainInfo(45, 'American Academy Orthopaedic Surgeons', AMERICAN_GUIDELINE),
+    'aossm.org': DomainInfo(42, 'American Orthopaedic Society Sports Med', AMERICAN_GUIDELINE),
+    'rsna.org': DomainInfo(40, 'Radiological Society North America', None),
+    'ajronline.org': DomainInfo(38, 'Clinical Source', None),
+
+    # Tier 5: International Evidence-Based Sources
+    'cochranelibrary.com': DomainInfo(35, 'Cochrane Systematic Review', COCHRANE),
+    'cochrane.org': DomainInfo(35, 'Cochrane Systematic Review', COCHRANE),
+    'who.int': DomainInfo(32, 'World Health Organization', None),
+
+    # Tier 6: High-Impact Journals
+    'bmj.com': DomainInfo(30, 'British Medical Journal', HIGH_IMPACT_JOURNAL),
+    'thelancet.com': DomainInfo(28, 'The Lancet', HIGH_IMPACT_JOURNAL),
+    'nejm.org': DomainInfo(26, 'New England Journal of Medicine', HIGH_IMPACT_JOURNAL),
+    'nature.com': DomainInfo(24, 'Nature Journal', None),
+
+    # Tier 7: PubMed and Other Academic Sources
+    'pubmed.ncbi.nlm.nih.gov': DomainInfo(20, 'PubMed Research Database', None),
+    'ncbi.nlm.nih.gov': DomainInfo(18, 'PubMed Research Database', None),
+    'academic.oup.com': DomainInfo(16, 'Oxford Academic', None),
+    'springer.com': DomainInfo(14, 'Springer Academic', None),
+    'wiley.com': DomainInfo(12, 'Wiley Academic', None),
+    'elsevier.com': DomainInfo(10, 'Elsevier Academic', None),
+    'journals.lww.com': DomainInfo(8, 'Clinical Source', None)
+}
+
+
+def url_hostname(url: str) -> str:
+    """Lower-cased hostname of a URL, tolerating missing schemes"""
+    if '//' not in url:
+        url = '//' + url
+    try:
+        return (urlsplit(url).hostname or '').rstrip('.')
+    except ValueError:
+        return ''
+
+
+@lru_cache(maxsize=4096)
+def classify_host(host: str) -> DomainInfo:
+    """Match a hostname against the registry by longest label suffix"""
+    labels = host.split('.')
+    for i in range(len(labels)):
+        info = DOMAIN_REGISTRY.get('.'.join(labels[i:]))
+        if info is not None:
+            return info
+    return UNKNOWN_SOURCE
+
+
+def classify_url(url: str) -> DomainInfo:
+    """Priority, source label and evidence tier for a URL"""
+    return classify_host(url_hostname(url))
@@ -0,0 +1,90 @@
+import re
+import zlib
+from typing import Dict, List, Set
+
+# Rough characters-per-token ratio for English prose, used instead of a tokenizer
+CHARS_PER_TOKEN = 4
+
+SHINGLE_WORDS = 5
+
+# Share of a sentence's shingles already seen above which it counts as a repeat
+DUPLICATE_CONTAINMENT = 0.7
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a prompt fragment"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def shingle_fingerprints(text: str, size: int = SHINGLE_WORDS) -> Set[int]:
+    """Hashed word shingles; texts shorter than one shingle hash as a whole"""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {zlib.crc32(' '.join(words).encode())} if words else set()
+    return {zlib.crc32(' '.join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}
+
+
+def _format_source(number: int, result: Dict, content: str) -> str:
+    text = f"\nSource {number}: {result.get('title', 'N/A')}\n"
+    text += f"URL: {result.get('url', 'N/A')}\n"
+    text += f"Content: {content}...\n"
+    text += "-" * 50 + "\n"
+    return text
+
+
+def build_evidence_text(results: List[Dict], token_budget: int = 900, max_sources: int = 8,
+                        source_chars: int = 500) -> str:
+    """Pack the most authoritative distinct evidence into a token budget.
+
+    Results are taken in the given (priority) order. Sentences whose shingles
+    mostly repeat earlier evidence are dropped, sources left with nothing new
+    are skipped, and packing stops when the budget is spent.
+    """
+    seen: Set[int] = set()
+    evidence_text = ""
+    remaining = token_budget
+    number = 0
+
+    for result in results[:max_sources]:
+        content = result.get('content') or ''
+        if not content:
+            kept = 'N/A'
+        else:
+            sentences = []
+            length = 0
+            for sentence in _SENTENCE_SPLIT.split(content):
+                sentence = sentence.strip()
+                if not sentence:
+                    continue
+                fingerprints = shingle_fingerprints(sentence)
+                if fingerprints and len(fingerprints & seen) / len(fingerprints) >= DUPLICATE_CONTAINMENT:
+                    continue
+                seen |= fingerprints
+                sentences.append(sentence)
+                length += len(sentence) + 1
+                if length >= source_chars:
+                    break
+            if not sentences:
+                continue
+            kept = ' '.join(sentences)[:source_chars]
+
+        section = _format_source(number + 1, result, kept)
+        cost = estimate_tokens(section)
+        if cost > remaining:
+            # Trim the last source to fit if a useful amount of room is left
+            spare_chars = (remaining - estimate_tokens(_format_source(number + 1, result, ''))) * CHARS_PER_TOKEN
+            if spare_chars < 100:
+                break
+            section = _format_source(number + 1, result, kept[:spare_chars])
+            cost = estimate_tokens(section)
+
+        evidence_text += section
+        remaining -= cost
+        number += 1
+        if remaining <= 0:
+            break
+
+    return evidence_text
@@ -0,0 +1,360 @@
+import re
+from collections import deque
+from typing import List, FrozenSet, Iterator, NamedTuple, Optional, Tuple
+
+# Anatomical and clinical abbreviations expanded before comparison
+ABBREVIATIONS = {
+    'acl': 'anterior cruciate ligament',
+    'pcl': 'posterior cruciate ligament',
+    'mcl': 'medial collateral ligament',
+    'lcl': 'lateral collateral ligament',
+    'mpfl': 'medial patellofemoral ligament',
+    'atfl': 'anterior talofibular ligament',
+    'cfl': 'calcaneofibular ligament',
+    'tfcc': 'triangular fibrocartilage complex',
+    'ucl': 'ulnar collateral ligament',
+    'itb': 'iliotibial band',
+    'acj': 'acromioclavicular joint',
+    'sij': 'sacroiliac joint',
+    'tfj': 'tibiofemoral joint',
+    'pfj': 'patellofemoral joint',
+    'dvt': 'deep vein thrombosis',
+    'pe': 'pulmonary embolism',
+    'avn': 'avascular necrosis',
+    'bml': 'bone marrow lesion',
+    'ocd': 'osteochondritis dissecans',
+    'fai': 'femoroacetabular impingement',
+    'slap': 'superior labrum anterior posterior',
+    'ddh': 'developmental dysplasia hip',
+    'oa': 'osteoarthritis'
+}
+
+# Spelling variants, plurals and adjectival forms mapped to one term
+SYNONYMS = {
+    'meniscal': 'meniscus',
+    'menisci': 'meniscus',
+    'meniscii': 'meniscus',
+    'torn': 'tear',
+    'tears': 'tear',
+    'tearing': 'tear',
+    'ruptured': 'rupture',
+    'ruptures': 'rupture',
+    'fractured': 'fracture',
+    'fractures': 'fracture',
+    'effusions': 'effusion',
+    'haemorrhage': 'hemorrhage',
+    'haemorrhagic': 'hemorrhage',
+    'haematoma': 'hematoma',
+    'oedema': 'edema',
+    'tumour': 'tumor',
+    'tumours': 'tumor',
+    'tumors': 'tumor',
+    'lesions': 'lesion',
+    'nodules': 'nodule',
+    'masses': 'mass',
+    'ligamentous': 'ligament',
+    'ligaments': 'ligament',
+    'tendinous': 'tendon',
+    'tendons': 'tendon',
+    'chondral': 'cartilage',
+    'chondropathy': 'cartilage damage',
+    'chondrosis': 'cartilage damage',
+    'oesophageal': 'esophageal',
+    'dilated': 'dilatation',
+    'dilation': 'dilatation',
+    'thrombosed': 'thrombus',
+    'thrombi': 'thrombus',
+    'metastases': 'metastasis',
+    'metastatic': 'metastasis',
+    'partially': 'partial',
+    'completely': 'complete',
+    'full': 'complete'
+}
+
+# Words carrying no clinical meaning for matching purposes
+STOPWORDS = {
+    'a', 'an', 'the', 'of', 'with', 'within', 'in', 'on', 'at', 'to', 'and',
+    'is', 'are', 'was', 'there', 'which', 'noted', 'seen', 'identified',
+    'evidence', 'appearances', 'demonstrated', 'present'
+}
+
+# Certainty hedges: left out of search terms, but part of a finding's identity
+HEDGE_TERMS = {
+    'likely', 'probable', 'probably', 'possible', 'possibly', 'suggestive', 'consistent',
+    'suspected', 'suspicious', 'equivocal', 'query', 'questionable'
+}
+
+# Laterality, position, extent and severity terms; findings differing in any of these are never merged
+DISCRIMINATING_TERMS = {
+    'left', 'right', 'bilateral', 'medial', 'lateral', 'anterior', 'posterior', 'superior', 'inferior',
+    'proximal', 'distal', 'upper', 'lower', 'partial', 'complete', 'incomplete', 'mild', 'moderate',
+    'severe', 'small', 'large', 'minimal', 'grade', 'acute', 'chronic', 'displaced', 'undisplaced',
+    'nondisplaced', 'high', 'low', 'no', 'not', 'without'
+} | HEDGE_TERMS
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:\.[0-9]+)?')
+
+
+def _normalized_terms(text: str) -> List[str]:
+    """Terms of free text in order, with abbreviations and synonyms expanded and stopwords dropped"""
+    terms = []
+    for raw in _TOKEN_PATTERN.findall(text.lower()):
+        for token in ABBREVIATIONS.get(raw, raw).split():
+            for term in SYNONYMS.get(token, token).split():
+                if term not in STOPWORDS:
+                    terms.append(term)
+    return terms
+
+
+def finding_terms(text: str) -> List[str]:
+    """Normalized search terms of free text in order, repeats kept, certainty hedges dropped"""
+    return [term for term in _normalized_terms(text) if term not in HEDGE_TERMS]
+
+
+def finding_tokens(finding: str) -> FrozenSet[str]:
+    """Normalized, order-insensitive token set for a free-text finding, certainty hedges kept"""
+    return frozenset(_normalized_terms(finding))
+
+
+def canonicalize_finding(finding: str) -> str:
+    """Stable key shared by equivalent phrasings, e.g. 'Partial tear of the ACL' and 'ACL partial tear'"""
+    return ' '.join(sorted(finding_tokens(finding)))
+
+
+def normalize_finding(finding: str) -> str:
+    """Normalized text of a finding with word order, certainty and laterality preserved.
+
+    Stricter than canonicalize_finding: only case, punctuation, stopwords and
+    spelling variants are ignored, so it is safe for reusing results across
+    report versions or patients.
+    """
+    return ' '.join(_normalized_terms(finding))
+
+
+def _discriminators(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    """Tokens that change a finding's meaning: laterality, extent, certainty, and numbers (grades, levels, sizes)"""
+    return frozenset(token for token in tokens if token in DISCRIMINATING_TERMS or any(ch.isdigit() for ch in token))
+
+
+def merge_duplicate_findings(findings: List[str], threshold: float = 0.8) -> List[str]:
+    """Drop findings whose token sets match an earlier finding's, keeping first-seen wording and order
+
+    Near-duplicates merge at the Jaccard threshold only when they agree on every
+    discriminating token, so 'Left femoral neck fracture' and 'Right femoral
+    neck fracture' (or grade 2 and grade 3) are both kept.
+    """
+    kept = []
+    kept_tokens = []
+    for finding in findings:
+        tokens = finding_tokens(finding)
+        duplicate = False
+        for existing in kept_tokens:
+            if _discriminators(tokens) != _discriminators(existing):
+                continue
+            union = tokens | existing
+            if not union or len(tokens & existing) / len(union) >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(finding)
+            kept_tokens.append(tokens)
+    return kept
+
+
+# Keywords that indicate significant findings
+SIGNIFICANT_TERMS = [
+    'tear', 'fracture', 'mass', 'lesion', 'stenosis', 'occlusion',
+    'thrombus', 'embolism', 'hemorrhage', 'hematoma', 'abscess',
+    'tumor', 'malignancy', 'metastasis', 'displacement', 'rupture',
+    'perforation', 'obstruction', 'dilatation', 'effusion',
+    'fluid collection', 'abnormal signal', 'enhancement', 'nodule',
+
+    # Musculoskeletal terms common in MRI reporting
+    'haemorrhage', 'haematoma', 'tumour', 'chondropathy', 'chondral defect',
+    'chondral loss', 'heterogenous signal', 'heterogeneous signal', 'high signal',
+    'increased signal', 'bone marrow oedema', 'bone marrow edema', 'bone bruise',
+    'contusion', 'sprain', 'dislocation', 'subluxation', 'erosion', 'cyst',
+    'bursitis', 'tendinopathy', 'tendinosis', 'osteophyte', 'avulsion',
+    'displaced flap', 'degeneration'
+]
+
+# Cues negating terms that follow them in the same sentence
+PRE_NEGATION_CUES = [
+    'no', 'not', 'nor', 'without', 'negative for', 'absence of', 'absent',
+    'free of', 'resolution of', 'rather than'
+]
+
+# Cues negating terms that precede them in the same sentence
+POST_NEGATION_CUES = [
+    'not seen', 'not identified', 'not demonstrated', 'not present',
+    'is excluded', 'was excluded', 'ruled out', 'has resolved', 'have resolved'
+]
+
+# Words ending the scope of a negation cue
+NEGATION_TERMINATORS = [
+    'but', 'however', 'although', 'though', 'while', 'whereas', 'apart from', 'except', 'aside from'
+]
+
+# Statements of normality that need no LLM interpretation
+NORMAL_CUES = ['normal', 'unremarkable', 'intact', 'preserved', 'satisfactory', 'within normal limits']
+
+_TERM = 'term'
+_PRE_NEGATION = 'pre_negation'
+_POST_NEGATION = 'post_negation'
+_TERMINATOR = 'terminator'
+_NORMAL = 'normal'
+
+# Suffixes a matched finding term may carry, e.g. 'tears', 'effusions'
+_TERM_SUFFIXES = ('', 's', 'es', 'ed', 'ing')
+
+# Sentences end at . ! or ? except decimal points such as '1.5cm'
+_SENTENCE_PATTERN = re.compile(r'(?:[^.!?]|(?<=\d)\.(?=\d))+')
+
+
+class LocalExtraction(NamedTuple):
+    findings: List[str]
+    confident: bool  # Every sentence was explained locally, so no LLM pass is needed
+
+
+class AhoCorasick:
+    """Multi-pattern matcher reporting every (start, end, pattern) occurrence in one pass"""
+
+    def __init__(self, patterns: List[str]):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(pattern)
+
+        # Breadth-first construction of failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Yield every pattern occurrence, overlapping ones included"""
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern in self._output[state]:
+                yield i - len(pattern) + 1, i + 1, pattern
+
+
+class LocalFindingExtractor:
+    """Rule-based extractor: keyword matching with negation scopes, preserving the report's wording"""
+
+    def __init__(self, terms: Optional[List[str]] = None, max_findings: int = 5,
+                 max_confident_chars: int = 1500):
+        self.max_findings = max_findings
+        self.max_confident_chars = max_confident_chars
+
+        self._kinds = {}
+        for kind, cues in ((_NORMAL, NORMAL_CUES), (_TERMINATOR, NEGATION_TERMINATORS),
+                           (_PRE_NEGATION, PRE_NEGATION_CUES), (_POST_NEGATION, POST_NEGATION_CUES),
+                           (_TERM, terms or SIGNIFICANT_TERMS)):
+            for cue in cues:
+                self._kinds[cue.lower()] = kind
+        self._matcher = AhoCorasick(list(self._kinds))
+
+    def _matches(self, lowered: str) -> List[Tuple[int, int, str]]:
+        """Whole-word matches as (start, end, kind); finding terms may carry a plural or verb suffix"""
+        matches = []
+        for start, end, pattern in self._matcher.finditer(lowered):
+            if start > 0 and lowered[start - 1].isalnum():
+                continue
+            kind = self._kinds[pattern]
+            word_end = end
+            while word_end < len(lowered) and lowered[word_end].isalpha():
+                word_end += 1
+            suffix = lowered[end:word_end]
+            if (kind == _TERM and suffix not in _TERM_SUFFIXES) or (kind != _TERM and suffix):
+                continue
+            matches.append((start, end, kind))
+        # Longer cues win where they overlap shorter ones, e.g. 'not seen' over 'not'
+        matches.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        return matches
+
+    def _sentence_status(self, matches: List[Tuple[int, int, str]]) -> Tuple[bool, bool]:
+        """(has an affirmed finding term, sentence is otherwise explained by negation or normality)"""
+        affirmed = False
+        explained = False
+        scope = None  # Most recent pre-negation or terminator
+        terms = []
+        covered_until = -1
+        for start, end, kind in matches:
+            if start < covered_until and kind != _TERM:
+                continue
+            covered_until = max(covered_until, end)
+            if kind == _TERM:
+                terms.append((start, scope == _PRE_NEGATION))
+                explained = True
+            elif kind == _PRE_NEGATION or kind == _TERMINATOR:
+                scope = kind
+                explained = explained or kind == _PRE_NEGATION
+            elif kind == _POST_NEGATION:
+                # Negates every term since the last terminator
+                terms = [(position, True) for position, _ in terms]
+                explained = True
+            elif kind == _NORMAL:
+                explained = True
+            if kind == _TERMINATOR:
+                affirmed = affirmed or any(not negated for _, negated in terms)
+                terms = []
+        affirmed = affirmed or any(not negated for _, negated in terms)
+        return affirmed, explained
+
+    def extract(self, report_text: str) -> LocalExtraction:
+        """Extract positive finding sentences in report order and judge whether the result is complete"""
+        # Lower-case without changing offsets so matches index the original text
+        lowered = ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in report_text)
+        all_matches = self._matches(lowered)
+
+        findings = []
+        unexplained = 0
+        position = 0
+        for sentence in _SENTENCE_PATTERN.finditer(report_text):
+            start, end = sentence.span()
+            sentence_matches = []
+            while position < len(all_matches) and all_matches[position][0] < end:
+                if all_matches[position][0] >= start:
+                    sentence_matches.append(all_matches[position])
+                position += 1
+
+            text = sentence.group().strip()
+            if not text:
+                continue
+
+            affirmed, explained = self._sentence_status(sentence_matches)
+            if affirmed:
+                if len(text) > 15:
+                    findings.append(text[0].upper() + text[1:])
+            elif not explained:
+                unexplained += 1
+
+        confident = (
+            bool(findings)
+            and unexplained == 0
+            and len(findings) <= self.max_findings
+            and len(report_text) <= self.max_confident_chars
+        )
+        return LocalExtraction(findings[:self.max_findings], confident)
@@ -0,0 +1,183 @@
+import asyncio
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# Progress of the job running in the current context, None outside a job
+_current_progress: contextvars.ContextVar[Optional['JobProgress']] = \
+    contextvars.ContextVar('job_progress', default=None)
+
+
+class JobProgress:
+    """Thread-safe stage and finding/query counters for one job"""
+
+    def __init__(self):
+        self.stage = QUEUED
+        self.findings_total = 0
+        self.findings_done = 0
+        self.queries_total = 0
+        self.queries_done = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counts: int):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'stage': self.stage,
+                'findings_total': self.findings_total,
+                'findings_done': self.findings_done,
+                'queries_total': self.queries_total,
+                'queries_done': self.queries_done,
+                'message': f"finding {self.findings_done}/{self.findings_total}, "
+                           f"query {self.queries_done}/{self.queries_total}"
+            }
+
+
+def set_progress_stage(stage: str):
+    """Name the pipeline stage of the current job, if one is running"""
+    progress = _current_progress.get()
+    if progress is not None:
+        progress.stage = stage
+
+
+def add_progress(**counts: int):
+    """Advance the current job's counters (findings_total, findings_done, queries_total, queries_done)"""
+    progress = _current_progress.get()
+    if progress is not None:
+        progress.add(**counts)
+
+
+class Job:
+    """One submitted analysis and its outcome"""
+
+    def __init__(self, payload: Any):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.status = QUEUED
+        self.progress = JobProgress()
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': self.progress.to_dict(),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobQueue:
+    """Bounded queue of analyses run by a fixed pool of asyncio workers.
+
+    submit() fails fast with asyncio.QueueFull once max_queued jobs are waiting,
+    so bursts are absorbed up to a known depth instead of holding connections
+    open. Finished jobs are kept for retention_seconds (at most max_retained).
+    """
+
+    def __init__(self, handler: Callable[[Any], Awaitable[Any]], workers: int = 2, max_queued: int = 100,
+                 retention_seconds: float = 3600, max_retained: int = 1000):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.max_retained = max_retained
+
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Start the worker pool inside the running event loop"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers; queued and running jobs are abandoned"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, payload: Any) -> Job:
+        """Queue a job and return it immediately; raises asyncio.QueueFull at max_queued"""
+        if self._queue is None:
+            raise RuntimeError("JobQueue.start() has not been called")
+        self._prune()
+        job = Job(payload)
+        self._queue.put_nowait(job)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by ID; None if unknown or expired"""
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and job counts by status"""
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return dict(counts, workers=self.workers, max_queued=self.max_queued,
+                    queue_depth=self._queue.qsize() if self._queue is not None else 0)
+
+    def _prune(self):
+        """Drop finished jobs past their retention, oldest first, and cap how many are kept"""
+        cutoff = time.time() - self.retention_seconds
+        finished = [job for job in self._jobs.values() if job.finished]
+        excess = len(finished) - self.max_retained
+        for job in finished:
+            if job.finished_at < cutoff or excess > 0:
+                del self._jobs[job.id]
+                excess -= 1
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = RUNNING
+        job.progress.stage = RUNNING
+        job.started_at = time.time()
+        token = _current_progress.set(job.progress)
+        try:
+            job.result = await self.handler(job.payload)
+            job.status = SUCCEEDED
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            _current_progress.reset(token)
+            job.progress.stage = job.status
+            job.finished_at = time.time()
@@ -1,13 +1,109 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import List
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from jobs import JobQueue
+from metrics import request_timings
+from providers import report_deadline
 from pydantic import BaseModel
-from RadiologyClinicalAI import RadiologyClinicalAI
+from radiology_ai_async import AsyncRadiologyClinicalAI
+from scheduler import BATCH, request_priority
+
+ai = AsyncRadiologyClinicalAI()
+
+async def run_job(report_text: str) -> str:
+    """Background jobs yield provider quota to interactive requests and get the longer job deadline"""
+    with request_priority(BATCH), report_deadline(ai.job_deadline_seconds):
+        return await ai.generate_report(report_text)
+
+# Background analyses: JOB_WORKERS reports run at once, JOB_QUEUE_DEPTH more may wait
+jobs = JobQueue(
+    run_job,
+    workers=int(os.environ.get("JOB_WORKERS", "2")),
+    max_queued=int(os.environ.get("JOB_QUEUE_DEPTH", "100"))
+)
 
-app = FastAPI()
-ai = RadiologyClinicalAI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    jobs.start()
+    yield
+    await jobs.stop()
+    # Close pooled provider connections on shutdown
+    await ai.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 class Report(BaseModel):
     report_text: str
 
+class AmendedReport(BaseModel):
+    report_id: str
+    report_text: str
+
+class ReportBatch(BaseModel):
+    reports: List[str]
+
 @app.post("/analyze")
-async def analyze(report: Report):
-    return {"analysis": ai.generate_report(report.report_text)}
+async def analyze(report: Report, timings: bool = False):
+    """Analyse one report; ?timings=true adds a per-stage latency breakdown"""
+    with request_timings() as breakdown:
+        response = {"analysis": await ai.generate_report(report.report_text)}
+    if timings:
+        response["timings"] = breakdown
+    return response
+
+@app.post("/analyze/batch")
+async def analyze_batch(batch: ReportBatch, timings: bool = False):
+    """Analyse a session's reports together, running each shared finding's search once"""
+    with request_timings() as breakdown, request_priority(BATCH):
+        response = await ai.generate_batch_reports(batch.reports)
+    if timings:
+        response["timings"] = breakdown
+    return response
+
+@app.post("/jobs", status_code=202)
+async def submit_job(report: Report):
+    """Queue a report for background analysis and return its job ID immediately"""
+    try:
+        job = jobs.submit(report.report_text)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Job queue is full", headers={"Retry-After": "30"})
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status, progress (e.g. "finding 3/5, query 12/20") and, once finished, the analysis"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: stage and provider latencies, call/error counts, cache stats"""
+    return PlainTextResponse(await asyncio.to_thread(ai.render_metrics), media_type="text/plain; version=0.0.4")
+
+@app.post("/analyze/incremental")
+async def analyze_incremental(report: AmendedReport):
+    """Analyse a report version under a stable ID, reusing unchanged findings from its previous analysis"""
+    return await ai.generate_incremental_report(report.report_id, report.report_text)
+
+@app.post("/analyze/stream")
+async def analyze_stream(report: Report):
+    """Server-sent events: findings list, each finding as it completes, then the summary"""
+    async def events():
+        async for event in ai.stream_report(report.report_text):
+            if event['event'] == 'ping':
+                yield ": ping\n\n"
+            else:
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,178 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+# Latency buckets in seconds, from cache hits up to slow LLM generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Per-request stage breakdown, set for the duration of one analysis
+_request_timings: contextvars.ContextVar[Optional[Dict[str, Dict[str, float]]]] = \
+    contextvars.ContextVar('request_timings', default=None)
+_request_timings_lock = threading.Lock()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, Any]]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in (labels or {}).items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def with_current_context(fn: Callable) -> Callable:
+    """Wrap fn so each call runs in a copy of the caller's context, e.g. inside a thread pool"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def timed(stage: str) -> Callable:
+    """Decorate a RadiologyClinicalAI method (sync or async) to time it as a pipeline stage"""
+    def decorator(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(self, *args, **kwargs):
+                with self.metrics.timer(stage):
+                    return await fn(self, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.timer(stage):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms rendered in the Prometheus text format"""
+
+    def __init__(self, prefix: str = 'radiology', buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, list]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, text: str):
+        """Attach HELP text to a metric"""
+        self._help[name] = text
+
+    def inc(self, name: str, value: float = 1.0, labels: Optional[Dict[str, Any]] = None):
+        """Increase a counter"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None):
+        """Set a gauge to an absolute value"""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None):
+        """Record one observation in a histogram"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def counter_value(self, name: str, labels: Optional[Dict[str, Any]] = None) -> float:
+        """Current value of one counter series"""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time a pipeline stage into the stage histogram and the current request's breakdown"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe('stage_seconds', elapsed, {'stage': stage})
+            record_request_timing(stage, elapsed)
+
+    def record_provider_call(self, provider: str, seconds: float, status: Any, response_bytes: int = 0):
+        """Account one upstream HTTP call; status is the HTTP status code or 'error'"""
+        labels = {'provider': provider}
+        self.observe('provider_request_seconds', seconds, labels)
+        self.inc('provider_requests_total', labels={'provider': provider, 'status': status})
+        if status == 'error' or (isinstance(status, int) and status >= 400):
+            self.inc('provider_errors_total', labels=labels)
+        if response_bytes:
+            self.inc('provider_response_bytes_total', response_bytes, labels)
+        record_request_timing(f'provider.{provider}', seconds)
+
+    def render(self) -> str:
+        """Prometheus text exposition of every metric"""
+        lines = []
+        with self._lock:
+            for kind, metrics in (('counter', self._counters), ('gauge', self._gauges)):
+                for name in sorted(metrics):
+                    full_name = f'{self.prefix}_{name}'
+                    if name in self._help:
+                        lines.append(f'# HELP {full_name} {self._help[name]}')
+                    lines.append(f'# TYPE {full_name} {kind}')
+                    for key, value in sorted(metrics[name].items()):
+                        lines.append(f'{full_name}{_format_labels(key)} {value:g}')
+
+            for name in sorted(self._histograms):
+                full_name = f'{self.prefix}_{name}'
+                if name in self._help:
+                    lines.append(f'# HELP {full_name} {self._help[name]}')
+                lines.append(f'# TYPE {full_name} histogram')
+                for key, (bucket_counts, total, count) in sorted(self._histograms[name].items()):
+                    for bound, bucket_count in zip(self.buckets, bucket_counts):
+                        lines.append(f'{full_name}_bucket{_format_labels(key, ("le", f"{bound:g}"))} {bucket_count}')
+                    lines.append(f'{full_name}_bucket{_format_labels(key, ("le", "+Inf"))} {count}')
+                    lines.append(f'{full_name}_sum{_format_labels(key)} {total:g}')
+                    lines.append(f'{full_name}_count{_format_labels(key)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def record_request_timing(stage: str, seconds: float):
+    """Add time to the current request's breakdown, if one is being collected"""
+    timings = _request_timings.get()
+    if timings is not None:
+        with _request_timings_lock:
+            entry = timings.setdefault(stage, {'seconds': 0.0, 'calls': 0})
+            entry['seconds'] += seconds
+            entry['calls'] += 1
+
+
+@contextmanager
+def request_timings() -> Iterator[Dict[str, Dict[str, float]]]:
+    """Collect a per-stage timing breakdown for everything run inside the block"""
+    timings: Dict[str, Dict[str, float]] = {}
+    token = _request_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings['total'] = {'seconds': time.perf_counter() - started, 'calls': 1}
+        _request_timings.reset(token)
@@ -0,0 +1,250 @@
+import asyncio
+import contextvars
+import functools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterator, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connections kept alive per provider; Tavily is sized for concurrent query fan-out
+DEFAULT_POOL_SIZES = {
+    'tavily': 50,
+    'cohere': 10,
+    'groq': 20
+}
+
+# Read timeouts in seconds; LLM providers get longer to finish generating
+DEFAULT_TIMEOUTS = {
+    'tavily': 30.0,
+    'cohere': 60.0,
+    'groq': 120.0
+}
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+
+# Responses worth retrying: rate limited or a transient server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Absolute monotonic deadline of the request being processed, None when unbounded
+_request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('request_deadline', default=None)
+
+# Deadline length for reports started in this context, overriding the pipeline's setting; a 1-tuple so
+# that an unbounded (None) override can be told apart from no override
+_report_deadline: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar('report_deadline', default=None)
+
+
+class CircuitOpenError(Exception):
+    """A provider's circuit breaker is open, so the call was not attempted"""
+
+
+class DeadlineExceeded(Exception):
+    """The request's overall deadline has passed"""
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float] = None, at: Optional[float] = None) -> Iterator[Optional[float]]:
+    """Bound everything inside the block by a deadline (never extending an enclosing one); yields it"""
+    deadline = at if at is not None else (time.monotonic() + seconds if seconds is not None else None)
+    current = _request_deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _request_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _request_deadline.reset(token)
+
+
+@contextmanager
+def report_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Give each report started inside the block this deadline (None = unbounded) instead of the pipeline's"""
+    token = _report_deadline.set((seconds,))
+    try:
+        yield
+    finally:
+        _report_deadline.reset(token)
+
+
+def report_deadline_seconds(default: Optional[float]) -> Optional[float]:
+    """Deadline for a report started now: the enclosing report_deadline() if any, else default"""
+    override = _report_deadline.get()
+    return default if override is None else override[0]
+
+
+def deadline_bound(fn: Callable) -> Callable:
+    """Decorate a pipeline entry point (sync or async) to run within one report's deadline"""
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(self, *args, **kwargs):
+            with request_deadline(report_deadline_seconds(self.request_deadline_seconds)):
+                return await fn(self, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        with request_deadline(report_deadline_seconds(self.request_deadline_seconds)):
+            return fn(self, *args, **kwargs)
+    return wrapper
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None if it has none"""
+    deadline = _request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Delay requested by a Retry-After header (seconds or HTTP date), if any"""
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker: open after failure_threshold failures, probe after reset_seconds"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted; in half-open state one probe at a time is let through"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and now - self._opened_at < self.reset_seconds:
+                return False
+            # Half-open: a probe that never reported back is replaced after reset_seconds
+            if self.state == self.HALF_OPEN and now - self._probe_started < self.reset_seconds:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ProviderClients:
+    """Long-lived, connection-pooled HTTP clients, one per provider, shared across requests"""
+
+    def __init__(self, pool_sizes: Optional[Dict[str, int]] = None,
+                 timeouts: Optional[Dict[str, float]] = None,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.pool_sizes = dict(DEFAULT_POOL_SIZES, **(pool_sizes or {}))
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.connect_timeout = connect_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+
+        self._sessions: Dict[str, requests.Session] = {}
+        self._async_clients: Dict[str, httpx.AsyncClient] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def pool_size(self, provider: str) -> int:
+        """Maximum pooled connections for a provider"""
+        return self.pool_sizes.get(provider, 10)
+
+    def timeout(self, provider: str, budget: Optional[float] = None) -> tuple:
+        """(connect, read) timeout pair for requests, shortened to fit a remaining time budget"""
+        read = self.timeouts.get(provider, 60.0)
+        if budget is not None:
+            return (min(self.connect_timeout, budget), min(read, budget))
+        return (self.connect_timeout, read)
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        """Circuit breaker shared by every call to a provider"""
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    provider, CircuitBreaker(self.failure_threshold, self.reset_seconds)
+                )
+        return breaker
+
+    def breakers(self) -> Dict[str, CircuitBreaker]:
+        """Breakers created so far, by provider"""
+        return dict(self._breakers)
+
+    def session(self, provider: str) -> requests.Session:
+        """Blocking keep-alive session for a provider, created on first use"""
+        session = self._sessions.get(provider)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(provider)
+                if session is None:
+                    size = self.pool_size(provider)
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._sessions[provider] = session
+        return session
+
+    def async_client(self, provider: str) -> httpx.AsyncClient:
+        """Async keep-alive client for a provider, created on first use inside the running loop"""
+        client = self._async_clients.get(provider)
+        if client is None or client.is_closed:
+            size = self.pool_size(provider)
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeouts.get(provider, 60.0), connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=size, max_keepalive_connections=size)
+            )
+            self._async_clients[provider] = client
+        return client
+
+    def close(self):
+        """Close all blocking sessions"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    async def aclose(self):
+        """Close all async clients and blocking sessions"""
+        clients = list(self._async_clients.values())
+        self._async_clients.clear()
+        for client in clients:
+            await client.aclose()
+        self.close()
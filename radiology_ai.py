@@ -1,9 +1,142 @@
-import requests
 import json
+import os
 import re
-from typing import List, Dict, Any
+import hashlib
+import requests
+from typing import List, Dict, Any, Optional, Tuple
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from collections import Counter
+from cache import SQLiteCache, content_key
+from coalesce import SingleFlight
+from corpus import GuidelineCorpus
+from evidence_prompt import build_evidence_text
+from domains import (DomainInfo, classify_url, NICE, NHS, UK_GUIDELINE, COCHRANE,
+                     EUROPEAN_GUIDELINE, AMERICAN_GUIDELINE, HIGH_IMPACT_JOURNAL)
+from findings import merge_duplicate_findings, normalize_finding, LocalFindingExtractor
+from jobs import add_progress, set_progress_stage
+from metrics import Metrics, timed, with_current_context
+from providers import (RETRY_STATUSES, CircuitOpenError, DeadlineExceeded, ProviderClients, backoff_delay,
+                       deadline_bound, remaining_time, retry_after_seconds)
+from result_index import QUERY_FAILED, QUERY_OK, QUERY_REJECTED, ResultIndex
+from scheduler import EXTRACTION, RECOMMENDATIONS, SEARCH, ProviderScheduler, report_flow, request_tokens
+
+# Guideline-targeted Tavily query templates, in priority order
+GUIDELINE_QUERY_TEMPLATES = [
+    # UK Guidelines
+    "{finding} NICE guidelines management",
+    "{finding} NHS England clinical guidelines",
+    "{finding} Royal College Radiologists RCR guidelines",
+    "{finding} SIGN Scottish guidelines",
+    "{finding} British Orthopaedic Association guidelines",
+    "{finding} British Society Skeletal Radiology guidelines",
+
+    # European Guidelines
+    "{finding} European Society Radiology ESR guidelines",
+    "{finding} European League Against Rheumatism EULAR guidelines",
+    "{finding} European Society Musculoskeletal Radiology ESSR",
+    "{finding} European Orthopaedic Research Society guidelines",
+
+    # American Guidelines
+    "{finding} American College Radiology ACR appropriateness criteria",
+    "{finding} American Academy Orthopaedic Surgeons AAOS guidelines",
+    "{finding} American Orthopaedic Society Sports Medicine guidelines",
+    "{finding} Radiological Society North America RSNA guidelines",
+
+    # International/Evidence-based
+    "{finding} Cochrane systematic review",
+    "{finding} WHO World Health Organization guidelines",
+    "{finding} International Skeletal Society guidelines",
+    "{finding} consensus statement management",
+    "{finding} clinical practice guidelines",
+    "{finding} evidence based management systematic review"
+]
+
+# Domains Tavily searches are restricted to
+TAVILY_INCLUDE_DOMAINS = [
+    # UK Sources
+    'nice.org.uk',
+    'nhs.uk',
+    'rcr.ac.uk',
+    'sign.ac.uk',
+    'boa.ac.uk',
+    'bssr.org.uk',
+    'nhsengland.nhs.uk',
+    'gov.uk',
+
+    # European Sources
+    'myesr.org',
+    'eular.org',
+    'essr.org',
+    'esska.org',
+    'eurospine.org',
+
+    # American Sources
+    'acr.org',
+    'aaos.org',
+    'aossm.org',
+    'rsna.org',
+    'ajronline.org',
+
+    # International/Evidence Sources
+    'cochranelibrary.com',
+    'who.int',
+    'pubmed.ncbi.nlm.nih.gov',
+    'ncbi.nlm.nih.gov',
+    'bmj.com',
+    'thelancet.com',
+    'nejm.org',
+    'nature.com',
+    'springer.com',
+    'wiley.com',
+    'elsevier.com',
+    'journals.lww.com',
+    'academic.oup.com'
+]
+
+# Identifies the query plan so cached evidence is not reused after it changes
+QUERY_PLAN_VERSION = hashlib.sha1(
+    json.dumps([GUIDELINE_QUERY_TEMPLATES, TAVILY_INCLUDE_DOMAINS]).encode()
+).hexdigest()[:12]
+
+# Recommendation text used when Groq does not answer successfully
+RECOMMENDATIONS_API_ERROR = "Unable to generate recommendations due to API error."
+RECOMMENDATIONS_SYSTEM_ERROR = "Unable to generate recommendations due to system error."
+
+
+class QueryPlanRun:
+    """Progress of one finding's query plan; the sync and async pipelines only issue and await the queries"""
+
+    def __init__(self, ai: 'RadiologyClinicalAI', queries: List[str]):
+        self.ai = ai
+        self.queries = queries
+        self.total = len(queries)
+        self.workers = max(1, min(ai.max_concurrent_queries, self.total))
+        self.index = ResultIndex()
+        self.in_flight = 0
+        self.next_position = 0
+        self.sufficient = False
+        add_progress(queries_total=self.total)
+
+    def next_query(self) -> Optional[Tuple[int, str]]:
+        """Position and text of the next query to issue, or None while the plan should wait or stop"""
+        if (self.sufficient or self.next_position >= self.total or self.in_flight >= self.workers
+                or (self.next_position and self.ai._search_time_exhausted())):
+            return None
+        position = self.next_position
+        self.next_position += 1
+        self.in_flight += 1
+        return position, self.queries[position]
+
+    def complete(self, position: int, outcome: str, results: List[Dict]):
+        """Record a finished query; queries already in flight when evidence becomes sufficient are kept"""
+        self.in_flight -= 1
+        # The index orders results by query position, not completion order
+        self.index.add_query_results(position, results, outcome)
+        add_progress(queries_done=1)
+        self.sufficient = self.ai._evidence_sufficient(self.index)
+
 
 class RadiologyClinicalAI:
     def __init__(self):
@@ -14,8 +147,28 @@ class RadiologyClinicalAI:
         
         # API URLs
         self.tavily_url = "https://api.tavily.com/search"
+        self.tavily_extract_url = "https://api.tavily.com/extract"
         self.cohere_url = "https://api.cohere.ai/v1/generate"
         self.groq_url = "https://api.groq.com/openai/v1/chat/completions"
+
+        # Pooled keep-alive HTTP clients, one per provider (pool sizes and timeouts configurable)
+        self.http = ProviderClients()
+
+        # Transient failures (timeouts, connection errors, 429, 5xx) are retried with jittered exponential
+        # backoff, honouring Retry-After; per-provider circuit breakers in self.http fail fast meanwhile
+        self.max_retries = 3
+        self.retry_base_delay = 0.5
+        self.retry_max_delay = 20.0   # Longer Retry-After requests are not waited for
+
+        # Overall time budget per report (None = unbounded); each call's timeout is capped by what is left,
+        # and evidence search stops issuing queries once less than deadline_reserve_seconds remain
+        self.request_deadline_seconds = 180.0
+        self.deadline_reserve_seconds = 30.0
+        # Background jobs queue behind interactive traffic and may take minutes, so get a longer deadline
+        self.job_deadline_seconds = 1800.0
+
+        # Stage and provider latency histograms, call/error counters (Prometheus format via render_metrics)
+        self.metrics = Metrics()
         
         # Priority search terms for guidelines
         self.priority_sources = [
@@ -31,92 +184,336 @@ class RadiologyClinicalAI:
             "clinical guidelines"
         ]
 
+        # Evidence search fan-out (1 = run queries sequentially)
+        self.max_concurrent_queries = 10
+
+        # Provider quotas shared by every report: per-provider request and token-per-minute buckets, with
+        # queued calls granted interactive before batch, extraction before searches, fairly across reports
+        self.scheduler = ProviderScheduler(metrics=self.metrics)
+
+        # Hedged extraction: start Groq if Cohere has not answered within the delay (seconds)
+        self.hedged_extraction = True
+        self.extraction_hedge_delay = 3.0
+
+        # Local rule-based extractor; with local_first, confident results skip the LLM extraction calls
+        self.local_extractor = LocalFindingExtractor()
+        self.local_first = False
+
+        # Lean mode: skip raw page text and keep only the result fields the pipeline reads
+        self.lean_results = True
+        self.result_content_chars = 1000
+        self.max_raw_content_bytes = 2_000_000  # Ceiling per fetch_raw_content call
+
+        # Recommendation prompt evidence: token budget, candidate sources and per-source characters
+        self.evidence_token_budget = 900
+        self.evidence_max_sources = 8
+        self.evidence_source_chars = 500
+
+        # Batched recommendations: one Groq call covers up to recommendation_batch_size findings
+        self.batched_recommendations = False
+        self.recommendation_batch_size = 4
+        self.batch_tokens_per_finding = 600
+        self.batch_recommendation_max_tokens = 2400
+
+        # Adaptive query plan: stop issuing queries once either target is met (None disables a target)
+        self.sufficient_tier1_sources = 4       # NICE/NHS results, enough for the top evidence tier
+        self.sufficient_guideline_sources = 5   # Guideline-tier results filling the top-5 evidence window
+
+        # Single-flight coalescing: concurrent identical evidence searches and recommendation calls
+        # (across reports) share one upstream call; coalesced_calls_total counts the callers that waited
+        self.evidence_flights = SingleFlight(on_coalesced=lambda: self.metrics.inc(
+            'coalesced_calls_total', labels={'operation': 'evidence_search'}))
+        self.recommendation_flights = SingleFlight(on_coalesced=lambda: self.metrics.inc(
+            'coalesced_calls_total', labels={'operation': 'recommendations'}))
+
+        # Findings processed in parallel per report (1 = one finding at a time)
+        self.max_concurrent_findings = 5
+
+        # Reports of a batch worked on at once; each gets its own request deadline when its work starts
+        self.max_concurrent_batch_reports = 4
+
+        # Persistent evidence cache shared across processes and restarts (None disables it)
+        self.cache_dir = '.radiology_cache'
+        self.evidence_cache = SQLiteCache(
+            os.path.join(self.cache_dir, 'evidence.sqlite3'),
+            ttl_seconds=7 * 24 * 3600,
+            max_entries=5000
+        )
+
+        # LLM response cache keyed by provider, model, prompt and parameters (None disables it;
+        # cache.MemoryCache is a drop-in in-process backend)
+        self.llm_cache = SQLiteCache(
+            os.path.join(self.cache_dir, 'llm.sqlite3'),
+            ttl_seconds=24 * 3600,
+            max_entries=2000
+        )
+
+        # Per-finding results of previously analysed reports, keyed by report ID and finding hash, so an
+        # amended report only reruns findings that were added or changed (None disables incremental reuse)
+        self.report_store = SQLiteCache(
+            os.path.join(self.cache_dir, 'reports.sqlite3'),
+            ttl_seconds=30 * 24 * 3600,
+            max_entries=20000
+        )
+
+        # Local guideline corpus (BM25, memory-mapped), built by `python corpus.py`; answers evidence
+        # lookups before Tavily. Misses and entries older than corpus_max_age_seconds go live.
+        self.corpus_dir = os.path.join(self.cache_dir, 'corpus')
+        self.corpus = GuidelineCorpus.load(self.corpus_dir)  # None until a corpus has been built
+        self.corpus_max_age_seconds = 30 * 24 * 3600
+        self.corpus_min_match = 0.6        # Share of the finding's IDF weight a document must contain
+        self.corpus_min_documents = 5      # Matching fresh documents needed to answer without Tavily
+
+    def close(self):
+        """Release pooled connections and caches"""
+        self.http.close()
+        self.scheduler.close()
+        self._close_caches()
+
+    def _close_caches(self):
+        """Close every enabled cache and the guideline corpus"""
+        for cache in (self.evidence_cache, self.llm_cache, self.report_store, self.corpus):
+            if cache is not None:
+                cache.close()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss statistics for each enabled cache"""
+        return {
+            name: cache.stats()
+            for name, cache in (('evidence', self.evidence_cache), ('llm', self.llm_cache),
+                                ('reports', self.report_store))
+            if cache is not None
+        }
+
+    def render_metrics(self) -> str:
+        """Prometheus text exposition, with cache statistics refreshed as gauges"""
+        for name, stats in self.cache_stats().items():
+            labels = {'cache': name}
+            self.metrics.set_gauge('cache_entries', stats['entries'], labels)
+            self.metrics.set_gauge('cache_hits', stats['hits'], labels)
+            self.metrics.set_gauge('cache_misses', stats['misses'], labels)
+            self.metrics.set_gauge('cache_hit_ratio', stats['hit_rate'], labels)
+        for provider, breaker in self.http.breakers().items():
+            self.metrics.set_gauge('provider_circuit_open', int(breaker.state != breaker.CLOSED),
+                                   {'provider': provider})
+        return self.metrics.render()
+
+    def _cached_llm_response(self, provider: str, data: Dict[str, Any]) -> Optional[str]:
+        """Previously returned completion text for an identical provider request"""
+        if self.llm_cache is None:
+            return None
+        return self.llm_cache.get(content_key(f"llm:{provider}", data))
+
+    def _store_llm_response(self, provider: str, data: Dict[str, Any], text: str):
+        """Remember completion text for an identical future request"""
+        if self.llm_cache is not None and text:
+            self.llm_cache.set(content_key(f"llm:{provider}", data), text)
+
+    @timed('extraction')
     def extract_key_findings(self, report_text: str) -> List[str]:
         """Extract key clinical findings from radiology report using Groq as backup"""
-        # First try Cohere, if fails use Groq
-        findings = self._extract_with_cohere(report_text)
-        if not findings:
-            print("Cohere failed, trying with Groq...")
-            findings = self._extract_with_groq(report_text)
+        local_findings = self._local_first_extraction(report_text)
+        if local_findings is not None:
+            return merge_duplicate_findings(local_findings)
+
+        if self.hedged_extraction:
+            findings = self._extract_hedged(report_text)
+        else:
+            # First try Cohere, if fails use Groq
+            findings = self._extract_with_cohere(report_text)
+            if not findings:
+                print("Cohere failed, trying with Groq...")
+                findings = self._extract_with_groq(report_text)
         
-        return findings
+        # Collapse rewordings of the same finding so each is searched once
+        return merge_duplicate_findings(findings)
     
-    def _extract_with_cohere(self, report_text: str) -> List[str]:
-        """Extract findings using Cohere API"""
+    def _extract_hedged(self, report_text: str) -> List[str]:
+        """Race Groq against Cohere once Cohere is slow or fails, keeping the first non-empty result"""
+        executor = ThreadPoolExecutor(max_workers=2)
         try:
-            prompt = f"""Analyze this radiology report and extract key positive clinical findings that require management:
+            cohere = executor.submit(with_current_context(self._extract_with_cohere), report_text)
+            wait([cohere], timeout=self.extraction_hedge_delay)
+            if cohere.done() and cohere.result():
+                return cohere.result()
 
-Report: {report_text}
+            print("Cohere slow or failed, hedging with Groq...")
+            groq = executor.submit(with_current_context(self._extract_with_groq), report_text, False)
+            pending = {groq} if cohere.done() else {cohere, groq}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.result():
+                        return future.result()
+        finally:
+            # The losing call is abandoned rather than awaited
+            executor.shutdown(wait=False, cancel_futures=True)
 
-List only significant findings as numbered points:"""
+        return self._manual_extraction(report_text)
+
+    def _auth_headers(self, api_key: str) -> Dict[str, str]:
+        """JSON headers with a bearer token"""
+        return {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
 
-            headers = {
-                'Authorization': f'Bearer {self.cohere_api_key}',
-                'Content-Type': 'application/json'
-            }
+    def _call_timeout(self, provider: str) -> tuple:
+        """Connect/read timeouts for the next call, capped by what is left of the request deadline"""
+        budget = remaining_time()
+        if budget is not None and budget <= 0:
+            raise DeadlineExceeded(f"Request deadline passed before {provider} call")
+        return self.http.timeout(provider, budget)
 
-            data = {
-                'model': 'command',
-                'prompt': prompt,
-                'max_tokens': 200,
-                'temperature': 0.1
-            }
+    def _admit_call(self, provider: str):
+        """Fail fast if the request deadline has passed or the provider's circuit is open"""
+        self._call_timeout(provider)
+        if not self.http.breaker(provider).allow():
+            self.metrics.inc('provider_circuit_rejections_total', labels={'provider': provider})
+            raise CircuitOpenError(f"{provider} circuit open, failing fast")
 
-            response = requests.post(self.cohere_url, headers=headers, json=data)
-            
-            if response.status_code == 200:
-                result = response.json()
-                findings_text = result['generations'][0]['text'].strip()
-                return self._parse_findings(findings_text)
+    def _record_outcome(self, provider: str, status: Any):
+        """Feed a call's outcome to the provider's circuit breaker; 429 and other 4xx do not count as failures"""
+        breaker = self.http.breaker(provider)
+        if status == 'error' or status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _retry_delay(self, provider: str, attempt: int, reason: Any, retry_after: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait before retrying a failed call, or None if it should not be retried"""
+        if attempt >= self.max_retries:
+            return None
+        if retry_after is None:
+            delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+        else:
+            delay = retry_after
+        budget = remaining_time()
+        if delay > self.retry_max_delay or (budget is not None and delay >= budget):
+            return None
+        self.metrics.inc('provider_retries_total', labels={'provider': provider, 'reason': reason})
+        print(f"Retrying {provider} in {delay:.1f}s after {reason} (retry {attempt + 1}/{self.max_retries})")
+        return delay
+
+    def _failed_call_delay(self, provider: str, attempt: int, started: float, timeout: tuple) -> Optional[float]:
+        """Record a call that raised; seconds to wait before retrying, or None to re-raise"""
+        self.metrics.record_provider_call(provider, time.perf_counter() - started, 'error')
+        # A timeout cut short by our own deadline says nothing about the provider's health
+        if timeout == self.http.timeout(provider):
+            self._record_outcome(provider, 'error')
+        return self._retry_delay(provider, attempt, 'error')
+
+    def _response_retry_delay(self, provider: str, attempt: int, started: float, response) -> Optional[float]:
+        """Record a call that returned; seconds to wait before retrying, or None to return the response"""
+        self.metrics.record_provider_call(provider, time.perf_counter() - started, response.status_code,
+                                          len(response.content))
+        self._record_outcome(provider, response.status_code)
+        if response.status_code not in RETRY_STATUSES:
+            return None
+        return self._retry_delay(provider, attempt, response.status_code, retry_after_seconds(response.headers))
+
+    def _post(self, provider: str, url: str, headers: Dict[str, str], data: Dict[str, Any], stage: int = SEARCH):
+        """Send a JSON POST to a provider API, with quota scheduling, deadline-capped timeouts and retries"""
+        attempt = 0
+        while True:
+            self._admit_call(provider)
+            self.scheduler.acquire(provider, stage, request_tokens(data))
+            timeout = self._call_timeout(provider)
+            session = self.http.session(provider)
+            started = time.perf_counter()
+            try:
+                response = session.post(url, headers=headers, json=data, timeout=timeout)
+            except requests.RequestException:
+                delay = self._failed_call_delay(provider, attempt, started, timeout)
+                if delay is None:
+                    raise
             else:
-                print(f"Cohere API error: {response.status_code} - {response.text}")
-                return []
-                
-        except Exception as e:
-            print(f"Cohere error: {str(e)}")
-            return []
-    
-    def _extract_with_groq(self, report_text: str) -> List[str]:
-        """Extract findings using Groq API as backup"""
-        try:
-            prompt = f"""Analyze this radiology report and extract key positive clinical findings that require management or follow-up:
+                delay = self._response_retry_delay(provider, attempt, started, response)
+                if delay is None:
+                    return response
+            attempt += 1
+            time.sleep(delay)
+
+    def _completion_text(self, provider: str, response) -> Optional[str]:
+        """Generated text from a Cohere or Groq response, or None (logged) if the call did not succeed"""
+        if response.status_code != 200:
+            print(f"{provider.capitalize()} API error: {response.status_code}")
+            return None
+        result = response.json()
+        if provider == 'cohere':
+            return result['generations'][0]['text'].strip()
+        return result['choices'][0]['message']['content']
+
+    def _build_cohere_extraction_request(self, report_text: str) -> Dict[str, Any]:
+        """Build the Cohere payload for finding extraction"""
+        prompt = f"""Analyze this radiology report and extract key positive clinical findings that require management:
+
+Report: {report_text}
+
+List only significant findings as numbered points:"""
+
+        return {
+            'model': 'command',
+            'prompt': prompt,
+            'max_tokens': 200,
+            'temperature': 0.1
+        }
+
+    def _build_groq_extraction_request(self, report_text: str) -> Dict[str, Any]:
+        """Build the Groq payload for finding extraction"""
+        prompt = f"""Analyze this radiology report and extract key positive clinical findings that require management or follow-up:
 
 Report: {report_text}
 
 Provide a numbered list of significant findings only:"""
 
-            headers = {
-                'Authorization': f'Bearer {self.groq_api_key}',
-                'Content-Type': 'application/json'
-            }
-
-            data = {
-                'model': 'deepseek-r1-distill-llama-70b',
-                'messages': [
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                'max_tokens': 200,
-                'temperature': 0.1
-            }
-
-            response = requests.post(self.groq_url, headers=headers, json=data)
-            
-            if response.status_code == 200:
-                result = response.json()
-                findings_text = result['choices'][0]['message']['content']
-                return self._parse_findings(findings_text)
-            else:
-                print(f"Groq API error: {response.status_code}")
-                # Fallback to manual extraction
-                return self._manual_extraction(report_text)
-                
+        return {
+            'model': 'deepseek-r1-distill-llama-70b',
+            'messages': [
+                {
+                    'role': 'user',
+                    'content': prompt
+                }
+            ],
+            'max_tokens': 200,
+            'temperature': 0.1
+        }
+
+    def _extraction_call(self, provider: str, report_text: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """URL, headers and payload of a finding-extraction call to Cohere or Groq"""
+        if provider == 'cohere':
+            return (self.cohere_url, self._auth_headers(self.cohere_api_key),
+                    self._build_cohere_extraction_request(report_text))
+        return self.groq_url, self._auth_headers(self.groq_api_key), self._build_groq_extraction_request(report_text)
+
+    def _extract_with(self, provider: str, report_text: str) -> List[str]:
+        """Extract findings with one LLM provider, returning an empty list on failure"""
+        try:
+            url, headers, data = self._extraction_call(provider, report_text)
+
+            findings_text = self._cached_llm_response(provider, data)
+            if findings_text is None:
+                findings_text = self._completion_text(provider, self._post(provider, url, headers, data, EXTRACTION))
+                if findings_text is None:
+                    return []
+                self._store_llm_response(provider, data, findings_text)
+            return self._parse_findings(findings_text)
+
         except Exception as e:
-            print(f"Groq error: {str(e)}")
+            print(f"{provider.capitalize()} error: {str(e)}")
+            return []
+
+    def _extract_with_cohere(self, report_text: str) -> List[str]:
+        """Extract findings using Cohere API"""
+        return self._extract_with('cohere', report_text)
+
+    def _extract_with_groq(self, report_text: str, manual_fallback: bool = True) -> List[str]:
+        """Extract findings using Groq API as backup, falling back to manual extraction"""
+        findings = self._extract_with('groq', report_text)
+        if not findings and manual_fallback:
             return self._manual_extraction(report_text)
-    
+        return findings
+
     def _parse_findings(self, findings_text: str) -> List[str]:
         """Parse AI response into list of findings"""
         findings = []
@@ -132,234 +529,303 @@ Provide a numbered list of significant findings only:"""
     def _manual_extraction(self, report_text: str) -> List[str]:
         """Manual extraction as last resort"""
         print("Using manual extraction as fallback...")
+        return self.local_extractor.extract(report_text).findings
+
+    def _local_first_extraction(self, report_text: str) -> Optional[List[str]]:
+        """Findings from the local extractor when local_first is on and it is confident, else None"""
+        if not self.local_first:
+            return None
+        local = self.local_extractor.extract(report_text)
+        if not local.confident:
+            return None
+        print("Using local extraction (all sentences recognised)...")
+        return local.findings
+
+    def _build_search_queries(self, finding: str) -> List[str]:
+        """Expand the guideline query templates for a finding"""
+        return [template.format(finding=finding) for template in GUIDELINE_QUERY_TEMPLATES]
+
+    def _build_tavily_request(self, query: str) -> Dict[str, Any]:
+        """Build the Tavily search payload for a single query"""
+        return {
+            'api_key': self.tavily_api_key,
+            'query': query,
+            'search_depth': 'advanced',
+            'include_answer': not self.lean_results,
+            'include_raw_content': not self.lean_results,
+            'max_results': 8,
+            'include_domains': TAVILY_INCLUDE_DOMAINS
+        }
+
+    def _accept_results(self, results: List[Dict]) -> List[Dict]:
+        """Trim results as they arrive to the fields the pipeline uses (lean mode only)"""
+        if not self.lean_results:
+            return results
+        trimmed = []
+        for result in results:
+            lean = {key: result[key] for key in ('title', 'url', 'score', 'content') if key in result}
+            if isinstance(lean.get('content'), str):
+                lean['content'] = lean['content'][:self.result_content_chars]
+            trimmed.append(lean)
+        return trimmed
+
+    def _take_raw_content(self, results: List[Dict], extracted: Dict[str, str], max_bytes: Optional[int]) -> List[Dict]:
+        """Attach raw page text to copies of results until the byte ceiling is reached"""
+        remaining = self.max_raw_content_bytes if max_bytes is None else max_bytes
+        enriched = []
+        for result in results:
+            raw = result.get('raw_content') or extracted.get(result.get('url', ''))
+            if raw and remaining > 0:
+                encoded = raw.encode('utf-8')[:remaining]
+                remaining -= len(encoded)
+                result = dict(result, raw_content=encoded.decode('utf-8', errors='ignore'))
+            enriched.append(result)
+        return enriched
+
+    def _raw_content_request(self, results: List[Dict]) -> Optional[Dict[str, Any]]:
+        """Tavily extract payload for results still lacking page text, or None if none are missing"""
+        missing = [r.get('url') for r in results if r.get('url') and not r.get('raw_content')]
+        return {'api_key': self.tavily_api_key, 'urls': missing} if missing else None
+
+    def _extracted_raw_content(self, response) -> Dict[str, str]:
+        """Page text by URL from a Tavily extract response"""
+        if response.status_code != 200:
+            print(f"Raw content fetch failed: {response.status_code}")
+            return {}
+        return {r.get('url'): r.get('raw_content') for r in response.json().get('results', [])}
+
+    def fetch_raw_content(self, results: List[Dict], max_bytes: Optional[int] = None) -> List[Dict]:
+        """Fetch full page text for results on demand, holding at most max_bytes for this call"""
+        data = self._raw_content_request(results)
+        extracted = {}
+        if data is not None:
+            try:
+                extracted = self._extracted_raw_content(
+                    self._post('tavily', self.tavily_extract_url, {'Content-Type': 'application/json'}, data)
+                )
+            except Exception as e:
+                print(f"Error fetching raw content: {str(e)}")
+        return self._take_raw_content(results, extracted, max_bytes)
+
+    def _search_results(self, response) -> Tuple[str, List[Dict]]:
+        """Outcome and accepted results of a Tavily search response"""
+        if response.status_code != 200:
+            print(f"Search failed for query: {response.status_code}")
+            return QUERY_FAILED, []
+        return QUERY_OK, self._accept_results(response.json().get('results', []))
+
+    def _search_query(self, query: str, index: int, total: int) -> Tuple[str, List[Dict]]:
+        """Run a single Tavily query, returning its outcome and results (empty unless it succeeded)"""
+        print(f"Searching query {index}/{total}: {query[:50]}...")
+        try:
+            return self._search_results(self._post(
+                'tavily', self.tavily_url, {'Content-Type': 'application/json'}, self._build_tavily_request(query)
+            ))
+        except (CircuitOpenError, DeadlineExceeded) as rejected:
+            print(f"Query {index} not sent: {str(rejected)}")
+            return QUERY_REJECTED, []
+        except Exception as query_error:
+            print(f"Error with query {index}: {str(query_error)}")
+            return QUERY_FAILED, []
+
+    def _evidence_cache_key(self, finding: str) -> str:
+        """Cache key for a finding's prioritized evidence under the current query plan"""
+        # Normalized text keeps each modifier with its structure, so "medial condyle ... lateral meniscal tear"
+        # never shares evidence with its mirror image; the v2 prefix retires token-set keyed entries
+        return f"evidence:v2:{QUERY_PLAN_VERSION}:{normalize_finding(finding)}"
+
+    def _cached_evidence(self, finding: str) -> Optional[Dict[str, Any]]:
+        """Return cached evidence for a finding, or None on a miss"""
+        if self.evidence_cache is None:
+            return None
+        cached_results = self.evidence_cache.get(self._evidence_cache_key(finding))
+        if cached_results is None:
+            return None
+        print(f"Evidence cache hit: {finding[:50]}")
+        return {
+            'finding': finding,
+            'results': cached_results,
+            'total_sources': len(cached_results),
+            'queries_run': 0,
+            'queries_failed': 0,
+            'queries_skipped': 0,
+            'trimmed': False
+        }
+
+    def _corpus_evidence(self, finding: str) -> Optional[Dict[str, Any]]:
+        """Prioritized evidence for a finding from the local guideline corpus, or None on a miss"""
+        if self.corpus is None:
+            return None
+        outcome, results = self.corpus.evidence(
+            finding,
+            min_match=self.corpus_min_match,
+            min_documents=self.corpus_min_documents,
+            max_age_seconds=self.corpus_max_age_seconds
+        )
+        self.metrics.inc('corpus_lookups_total', labels={'result': outcome})
+        if outcome != 'hit':
+            return None
+        print(f"Guideline corpus hit: {finding[:50]} ({len(results)} sources)")
+        prioritized_results = self.prioritize_sources(results)
+        return {
+            'finding': finding,
+            'results': prioritized_results,
+            'total_sources': len(prioritized_results),
+            'queries_run': 0,
+            'queries_failed': 0,
+            'queries_skipped': 0,
+            'trimmed': False
+        }
+
+    def _evidence_sufficient(self, index: ResultIndex) -> bool:
+        """Whether the results gathered so far already meet a sufficiency target"""
+        tier1 = index.tier_counts[NICE] + index.tier_counts[NHS]
+        guideline = sum(count for tier, count in index.tier_counts.items()
+                        if tier is not None and tier != HIGH_IMPACT_JOURNAL)
+
+        if self.sufficient_tier1_sources is not None and tier1 >= self.sufficient_tier1_sources:
+            return True
+        if self.sufficient_guideline_sources is not None and guideline >= self.sufficient_guideline_sources:
+            return True
+        return False
+
+    def _run_query_plan(self, queries: List[str]) -> ResultIndex:
+        """Issue queries in priority order, up to max_concurrent_queries at a time, until evidence is sufficient"""
+        plan = QueryPlanRun(self, queries)
+        pending = {}
+
+        with ThreadPoolExecutor(max_workers=plan.workers) as executor:
+            try:
+                while True:
+                    for position, query in iter(plan.next_query, None):
+                        future = executor.submit(with_current_context(self._search_query), query, position + 1,
+                                                 plan.total)
+                        pending[future] = position
+
+                    if not pending:
+                        break
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        plan.complete(pending.pop(future), *future.result())
+            finally:
+                # Abandon queries that have not started if the plan is interrupted
+                for future in pending:
+                    future.cancel()
+
+        return plan.index
+
+    def _search_time_exhausted(self) -> bool:
+        """Whether so little of the request deadline is left that further evidence queries are skipped"""
+        budget = remaining_time()
+        return budget is not None and budget < self.deadline_reserve_seconds
+
+    def _compile_evidence(self, finding: str, index: ResultIndex, total_queries: int) -> Dict[str, Any]:
+        """Prioritize and cache the de-duplicated results for a finding"""
+        all_results = index.results()
+        queries_skipped = total_queries - index.queries_issued
+        queries_failed = index.queries_failed + index.queries_rejected
+
+        self.metrics.inc('evidence_queries_skipped_total', queries_skipped)
+        self.metrics.inc('evidence_queries_failed_total', index.queries_failed, {'reason': 'failed'})
+        self.metrics.inc('evidence_queries_failed_total', index.queries_rejected, {'reason': 'rejected'})
+        add_progress(queries_total=-queries_skipped)
+        self.metrics.inc('evidence_duplicates_collapsed_total', index.duplicates)
+
+        # Stopping early without sufficient evidence means the request deadline cut the plan short
+        trimmed = queries_skipped > 0 and not self._evidence_sufficient(index)
+        if trimmed:
+            self.metrics.inc('deadline_trims_total', labels={'stage': 'evidence_search'})
+
+        print(f"Total unique sources found: {len(all_results)} ({index.duplicates} duplicates collapsed)")
+        if trimmed:
+            print(f"Request deadline near, searched {index.queries_issued}/{total_queries} queries")
+        elif queries_skipped:
+            print(f"Evidence sufficient after {index.queries_issued}/{total_queries} queries, skipped {queries_skipped}")
+        if queries_failed:
+            print(f"{queries_failed}/{index.queries_issued} queries failed or were not sent "
+                  f"({index.queries_rejected} rejected), evidence not cached")
         
-        # Keywords that indicate significant findings
-        significant_terms = [
-            'tear', 'fracture', 'mass', 'lesion', 'stenosis', 'occlusion',
-            'thrombus', 'embolism', 'hemorrhage', 'hematoma', 'abscess',
-            'tumor', 'malignancy', 'metastasis', 'displacement', 'rupture',
-            'perforation', 'obstruction', 'dilatation', 'effusion',
-            'fluid collection', 'abnormal signal', 'enhancement', 'nodule'
-        ]
-        
-        findings = []
-        sentences = re.split(r'[.!?]', report_text.lower())
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if any(term in sentence for term in significant_terms):
-                # Clean up and capitalize
-                clean_sentence = sentence.strip().capitalize()
-                if len(clean_sentence) > 15:
-                    findings.append(clean_sentence)
+        # Prioritize results by source reliability
+        prioritized_results = self.prioritize_sources(all_results)
+
+        # Only successful, complete searches are cached so outages and trimmed plans are retried next time
+        if self.evidence_cache is not None and prioritized_results and not trimmed and not queries_failed:
+            self.evidence_cache.set(self._evidence_cache_key(finding), prioritized_results)
         
-        return findings[:5]  # Limit to 5 findings
+        return {
+            'finding': finding,
+            'results': prioritized_results,
+            'total_sources': len(prioritized_results),
+            'queries_run': index.queries_run,
+            'queries_failed': queries_failed,
+            'queries_skipped': queries_skipped,
+            'trimmed': trimmed
+        }
 
+    @timed('evidence_search')
     def search_clinical_evidence(self, finding: str) -> Dict[str, Any]:
         """Search for comprehensive clinical evidence using Tavily API"""
         try:
-            # Create comprehensive search queries targeting multiple guideline sources
-            queries = [
-                # UK Guidelines
-                f"{finding} NICE guidelines management",
-                f"{finding} NHS England clinical guidelines",
-                f"{finding} Royal College Radiologists RCR guidelines",
-                f"{finding} SIGN Scottish guidelines",
-                f"{finding} British Orthopaedic Association guidelines",
-                f"{finding} British Society Skeletal Radiology guidelines",
-                
-                # European Guidelines
-                f"{finding} European Society Radiology ESR guidelines",
-                f"{finding} European League Against Rheumatism EULAR guidelines",
-                f"{finding} European Society Musculoskeletal Radiology ESSR",
-                f"{finding} European Orthopaedic Research Society guidelines",
-                
-                # American Guidelines
-                f"{finding} American College Radiology ACR appropriateness criteria",
-                f"{finding} American Academy Orthopaedic Surgeons AAOS guidelines",
-                f"{finding} American Orthopaedic Society Sports Medicine guidelines",
-                f"{finding} Radiological Society North America RSNA guidelines",
-                
-                # International/Evidence-based
-                f"{finding} Cochrane systematic review",
-                f"{finding} WHO World Health Organization guidelines",
-                f"{finding} International Skeletal Society guidelines",
-                f"{finding} consensus statement management",
-                f"{finding} clinical practice guidelines",
-                f"{finding} evidence based management systematic review"
-            ]
-            
-            all_results = []
-            
-            for i, query in enumerate(queries):
-                print(f"Searching query {i+1}/{len(queries)}: {query[:50]}...")
-                
-                headers = {
-                    'Content-Type': 'application/json'
-                }
-                
-                data = {
-                    'api_key': self.tavily_api_key,
-                    'query': query,
-                    'search_depth': 'advanced',
-                    'include_answer': True,
-                    'include_raw_content': True,
-                    'max_results': 8,
-                    'include_domains': [
-                        # UK Sources
-                        'nice.org.uk',
-                        'nhs.uk', 
-                        'rcr.ac.uk',
-                        'sign.ac.uk',
-                        'boa.ac.uk',
-                        'bssr.org.uk',
-                        'nhsengland.nhs.uk',
-                        'gov.uk',
-                        
-                        # European Sources
-                        'myesr.org',
-                        'eular.org',
-                        'essr.org',
-                        'esska.org',
-                        'eurospine.org',
-                        
-                        # American Sources
-                        'acr.org',
-                        'aaos.org',
-                        'aossm.org',
-                        'rsna.org',
-                        'ajronline.org',
-                        
-                        # International/Evidence Sources
-                        'cochranelibrary.com',
-                        'who.int',
-                        'pubmed.ncbi.nlm.nih.gov',
-                        'ncbi.nlm.nih.gov',
-                        'bmj.com',
-                        'thelancet.com',
-                        'nejm.org',
-                        'nature.com',
-                        'springer.com',
-                        'wiley.com',
-                        'elsevier.com',
-                        'journals.lww.com',
-                        'academic.oup.com'
-                    ]
-                }
-                
-                try:
-                    response = requests.post(self.tavily_url, headers=headers, json=data)
-                    
-                    if response.status_code == 200:
-                        results = response.json()
-                        if 'results' in results:
-                            # Filter out duplicates by URL
-                            new_results = []
-                            existing_urls = {r.get('url', '') for r in all_results}
-                            for result in results['results']:
-                                if result.get('url', '') not in existing_urls:
-                                    new_results.append(result)
-                            all_results.extend(new_results)
-                    else:
-                        print(f"Search failed for query: {response.status_code}")
-                        
-                except Exception as query_error:
-                    print(f"Error with query {i+1}: {str(query_error)}")
-                    continue
-                
-                time.sleep(0.3)  # Rate limiting
-            
-            print(f"Total unique sources found: {len(all_results)}")
-            
-            # Prioritize results by source reliability
-            prioritized_results = self.prioritize_sources(all_results)
-            
-            return {
-                'finding': finding,
-                'results': prioritized_results,
-                'total_sources': len(prioritized_results)
-            }
+            cached = self._cached_evidence(finding) or self._corpus_evidence(finding)
+            if cached is not None:
+                return cached
+
+            # Callers searching the same canonical finding at once share one query plan
+            evidence = self.evidence_flights.do(
+                self._evidence_cache_key(finding), lambda: self._search_evidence(finding)
+            )
+            return dict(evidence, finding=finding)
             
         except Exception as e:
             print(f"Error searching for {finding}: {str(e)}")
-            return {'finding': finding, 'results': [], 'total_sources': 0}
+            return {'finding': finding, 'results': [], 'total_sources': 0, 'search_failed': True}
+
+    def _search_evidence(self, finding: str) -> Dict[str, Any]:
+        """Run the query plan for a finding and compile its evidence"""
+        # Create comprehensive search queries targeting multiple guideline sources
+        queries = self._build_search_queries(finding)
+        index = self._run_query_plan(queries)
+
+        return self._compile_evidence(finding, index, len(queries))
 
     def prioritize_sources(self, results: List[Dict]) -> List[Dict]:
         """Prioritize search results based on source reliability and authority"""
-        priority_domains = {
-            # Tier 1: UK National Guidelines (Highest Priority)
-            'nice.org.uk': 100,
-            'nhs.uk': 95,
-            'nhsengland.nhs.uk': 90,
-            'sign.ac.uk': 85,  # Scottish Intercollegiate Guidelines Network
-            'gov.uk': 80,
-            
-            # Tier 2: UK Professional Bodies
-            'rcr.ac.uk': 75,  # Royal College of Radiologists
-            'boa.ac.uk': 70,  # British Orthopaedic Association
-            'bssr.org.uk': 65,  # British Society of Skeletal Radiology
-            
-            # Tier 3: European Guidelines
-            'eular.org': 60,  # European League Against Rheumatism
-            'myesr.org': 58,  # European Society of Radiology
-            'essr.org': 55,   # European Society of Musculoskeletal Radiology
-            'esska.org': 52,  # European Society of Sports, Knee & Arthroscopy
-            'eurospine.org': 50,
-            
-            # Tier 4: American Guidelines
-            'acr.org': 48,    # American College of Radiology
-            'aaos.org': 45,   # American Academy of Orthopaedic Surgeons
-            'aossm.org': 42,  # American Orthopaedic Society for Sports Medicine
-            'rsna.org': 40,   # Radiological Society of North America
-            'ajronline.org': 38,
-            
-            # Tier 5: International Evidence-Based Sources
-            'cochranelibrary.com': 35,
-            'who.int': 32,
-            
-            # Tier 6: High-Impact Journals
-            'bmj.com': 30,
-            'thelancet.com': 28,
-            'nejm.org': 26,
-            'nature.com': 24,
-            
-            # Tier 7: PubMed and Other Academic Sources
-            'pubmed.ncbi.nlm.nih.gov': 20,
-            'ncbi.nlm.nih.gov': 18,
-            'academic.oup.com': 16,
-            'springer.com': 14,
-            'wiley.com': 12,
-            'elsevier.com': 10,
-            'journals.lww.com': 8
-        }
-        
-        def get_priority(result):
-            url = result.get('url', '').lower()
-            for domain, priority in priority_domains.items():
-                if domain in url:
-                    return priority
-            return 1
+        # Classify each result once; ranking, grading and labelling reuse the annotations
+        classified = []
+        for result in results:
+            info = classify_url(result.get('url', ''))
+            classified.append(dict(
+                result,
+                source_priority=info.priority,
+                source_type=info.label,
+                evidence_tier=info.tier
+            ))
         
         # Sort by priority score, then by relevance score if available
         def sort_key(result):
-            priority = get_priority(result)
             relevance = result.get('score', 0.5)  # Default relevance if not provided
-            return (priority, relevance)
+            return (result['source_priority'], relevance)
         
-        return sorted(results, key=sort_key, reverse=True)
+        return sorted(classified, key=sort_key, reverse=True)
 
-    def generate_recommendations(self, finding: str, search_results: List[Dict]) -> str:
-        """Generate clinical recommendations using Groq"""
-        try:
-            # Prepare evidence summary
-            evidence_text = ""
-            for i, result in enumerate(search_results[:5]):  # Top 5 results
-                evidence_text += f"\nSource {i+1}: {result.get('title', 'N/A')}\n"
-                evidence_text += f"URL: {result.get('url', 'N/A')}\n"
-                evidence_text += f"Content: {result.get('content', 'N/A')[:500]}...\n"
-                evidence_text += "-" * 50 + "\n"
-
-            prompt = f"""
+    def _source_classification(self, source: Dict) -> DomainInfo:
+        """Classification recorded by prioritize_sources, or a fresh lookup for unranked sources"""
+        if 'source_priority' in source:
+            return DomainInfo(source['source_priority'], source['source_type'], source.get('evidence_tier'))
+        return classify_url(source.get('url', ''))
+
+    def _build_recommendation_request(self, finding: str, search_results: List[Dict]) -> Dict[str, Any]:
+        """Build the Groq payload asking for recommendations on one finding"""
+        # Prepare evidence summary: distinct, highest-priority passages within the token budget
+        evidence_text = build_evidence_text(
+            search_results,
+            token_budget=self.evidence_token_budget,
+            max_sources=self.evidence_max_sources,
+            source_chars=self.evidence_source_chars
+        )
+
+        prompt = f"""
             As an NHS consultant radiologist, provide evidence-based clinical recommendations for the following finding:
 
             FINDING: {finding}
@@ -382,65 +848,177 @@ Provide a numbered list of significant findings only:"""
             Format as clear, actionable clinical recommendations suitable for NHS practice.
             """
 
-            headers = {
-                'Authorization': f'Bearer {self.groq_api_key}',
-                'Content-Type': 'application/json'
-            }
-
-            data = {
-                'model': 'deepseek-r1-distill-llama-70b',
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': 'You are an expert NHS consultant radiologist providing evidence-based clinical recommendations.'
-                    },
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                'max_tokens': 800,
-                'temperature': 0.1
-            }
-
-            response = requests.post(self.groq_url, headers=headers, json=data)
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result['choices'][0]['message']['content']
-            else:
-                print(f"Groq API error: {response.status_code}")
-                return "Unable to generate recommendations due to API error."
+        return {
+            'model': 'deepseek-r1-distill-llama-70b',
+            'messages': [
+                {
+                    'role': 'system',
+                    'content': 'You are an expert NHS consultant radiologist providing evidence-based clinical recommendations.'
+                },
+                {
+                    'role': 'user',
+                    'content': prompt
+                }
+            ],
+            'max_tokens': 800,
+            'temperature': 0.1
+        }
+
+    def _build_batch_recommendation_request(self, findings: List[str], evidence_lists: List[List[Dict]]) -> Dict[str, Any]:
+        """Build one Groq payload asking for recommendations on several findings"""
+        # Each finding gets an even share of the evidence budget
+        share = max(200, self.evidence_token_budget // len(findings))
+        finding_blocks = ""
+        for i, (finding, search_results) in enumerate(zip(findings, evidence_lists), 1):
+            evidence_text = build_evidence_text(
+                search_results,
+                token_budget=share,
+                max_sources=self.evidence_max_sources,
+                source_chars=self.evidence_source_chars
+            )
+            finding_blocks += f"""
+            FINDING {i}: {finding}
+
+            AVAILABLE EVIDENCE:
+            {evidence_text}
+            """
+
+        prompt = f"""
+            As an NHS consultant radiologist, provide evidence-based clinical recommendations for each of the following {len(findings)} findings.
+            {finding_blocks}
+            For each finding provide:
+            1. IMMEDIATE MANAGEMENT (if urgent)
+            2. INVESTIGATION RECOMMENDATIONS
+            3. FOLLOW-UP REQUIREMENTS
+            4. REFERRAL RECOMMENDATIONS
+            5. PATIENT INFORMATION NEEDS
+
+            For each recommendation, specify:
+            - Strength of evidence (Strong/Moderate/Weak/Expert Opinion)
+            - Time frame for action
+            - Source of recommendation
+
+            Start each finding's section with a line containing exactly "### FINDING <number>" and nothing else,
+            in order from 1 to {len(findings)}. Keep each section concise and suitable for NHS practice.
+            """
+
+        return {
+            'model': 'deepseek-r1-distill-llama-70b',
+            'messages': [
+                {
+                    'role': 'system',
+                    'content': 'You are an expert NHS consultant radiologist providing evidence-based clinical recommendations.'
+                },
+                {
+                    'role': 'user',
+                    'content': prompt
+                }
+            ],
+            'max_tokens': min(self.batch_recommendation_max_tokens, self.batch_tokens_per_finding * len(findings)),
+            'temperature': 0.1
+        }
+
+    def _parse_batch_recommendations(self, text: str, count: int) -> List[Optional[str]]:
+        """Split a batched response into per-finding sections; missing or empty sections are None"""
+        text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+        sections: List[Optional[str]] = [None] * count
+        parts = re.split(r'^\s*[*_]*\s*#{1,6}\s*FINDING\s+(\d+)\b[^\n]*$', text, flags=re.MULTILINE | re.IGNORECASE)
+        # re.split alternates: preamble, number, body, number, body, ...
+        for number, body in zip(parts[1::2], parts[2::2]):
+            position = int(number) - 1
+            if 0 <= position < count and body.strip() and sections[position] is None:
+                sections[position] = body.strip()
+        return sections
+
+    def _missing_sections(self, sections: List[Optional[str]]) -> List[int]:
+        """Positions a batched response left without recommendations, to be requested individually"""
+        missing = [i for i, section in enumerate(sections) if not section]
+        if missing:
+            print(f"Batched response incomplete, requesting {len(missing)} finding(s) individually...")
+        return missing
+
+    @timed('batch_recommendations')
+    def generate_batch_recommendations(self, findings: List[str], evidence_lists: List[List[Dict]]) -> List[str]:
+        """Recommendations for several findings from one Groq call, falling back per finding if parsing fails"""
+        sections: List[Optional[str]] = [None] * len(findings)
+        try:
+            headers = self._auth_headers(self.groq_api_key)
+            data = self._build_batch_recommendation_request(findings, evidence_lists)
+
+            text = self._cached_llm_response('groq', data)
+            if text is None:
+                text = self._completion_text('groq', self._post('groq', self.groq_url, headers, data, RECOMMENDATIONS))
+
+            if text is not None:
+                sections = self._parse_batch_recommendations(text, len(findings))
+                # Only fully parsed responses are worth replaying
+                if all(sections):
+                    self._store_llm_response('groq', data, text)
+
+        except Exception as e:
+            print(f"Error generating batched recommendations: {str(e)}")
+
+        missing = self._missing_sections(sections)
+        if missing:
+            # Fallback calls run concurrently, as in the async pipeline; a batch holds few findings
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                fallbacks = executor.map(
+                    with_current_context(lambda i: self.generate_recommendations(findings[i], evidence_lists[i])),
+                    missing
+                )
+                for i, fallback in zip(missing, fallbacks):
+                    sections[i] = fallback
+        return sections
+
+    @timed('recommendations')
+    def generate_recommendations(self, finding: str, search_results: List[Dict]) -> str:
+        """Generate clinical recommendations using Groq"""
+        try:
+            headers = self._auth_headers(self.groq_api_key)
+            data = self._build_recommendation_request(finding, search_results)
+
+            cached_text = self._cached_llm_response('groq', data)
+            if cached_text is not None:
+                return cached_text
+
+            # Identical concurrent prompts share one Groq call
+            return self.recommendation_flights.do(
+                content_key('llm:groq', data), lambda: self._request_recommendations(headers, data)
+            )
                 
         except Exception as e:
             print(f"Error generating recommendations: {str(e)}")
-            return "Unable to generate recommendations due to system error."
+            return RECOMMENDATIONS_SYSTEM_ERROR
+
+    def _request_recommendations(self, headers: Dict[str, str], data: Dict[str, Any]) -> str:
+        """Send a recommendation request to Groq and cache the completion"""
+        recommendations = self._completion_text('groq', self._post('groq', self.groq_url, headers, data, RECOMMENDATIONS))
+        if recommendations is None:
+            return RECOMMENDATIONS_API_ERROR
+        self._store_llm_response('groq', data, recommendations)
+        return recommendations
 
     def format_evidence_strength(self, sources: List[Dict]) -> str:
         """Determine evidence strength based on source types and quality"""
         if not sources:
             return "INSUFFICIENT (No reliable sources found)"
         
-        # Count different types of high-quality sources
-        nice_count = sum(1 for s in sources if 'nice.org.uk' in s.get('url', '').lower())
-        nhs_count = sum(1 for s in sources if any(domain in s.get('url', '').lower() 
-                                                for domain in ['nhs.uk', 'nhsengland.nhs.uk']))
-        uk_guidelines = sum(1 for s in sources if any(domain in s.get('url', '').lower() 
-                                                    for domain in ['sign.ac.uk', 'rcr.ac.uk', 'boa.ac.uk']))
-        
-        cochrane_count = sum(1 for s in sources if 'cochrane' in s.get('url', '').lower())
-        
-        european_guidelines = sum(1 for s in sources if any(domain in s.get('url', '').lower() 
-                                                          for domain in ['eular.org', 'myesr.org', 'essr.org']))
-        
-        american_guidelines = sum(1 for s in sources if any(domain in s.get('url', '').lower() 
-                                                          for domain in ['acr.org', 'aaos.org', 'aossm.org']))
+        # Count different types of high-quality sources in a single pass
+        tier_counts = Counter()
+        systematic_review_count = 0
+        for s in sources:
+            tier_counts[self._source_classification(s).tier] += 1
+            content = (s.get('content') or '').lower()
+            if any(term in content for term in ['systematic review', 'meta-analysis', 'consensus statement']):
+                systematic_review_count += 1
         
-        systematic_review_count = sum(1 for s in sources if any(term in s.get('content', '').lower() 
-                                                              for term in ['systematic review', 'meta-analysis', 'consensus statement']))
-        
-        high_impact_journals = sum(1 for s in sources if any(domain in s.get('url', '').lower() 
-                                                           for domain in ['bmj.com', 'thelancet.com', 'nejm.org']))
+        nice_count = tier_counts[NICE]
+        nhs_count = tier_counts[NHS]
+        uk_guidelines = tier_counts[UK_GUIDELINE]
+        cochrane_count = tier_counts[COCHRANE]
+        european_guidelines = tier_counts[EUROPEAN_GUIDELINE]
+        american_guidelines = tier_counts[AMERICAN_GUIDELINE]
+        high_impact_journals = tier_counts[HIGH_IMPACT_JOURNAL]
         
         total_authoritative = nice_count + nhs_count + uk_guidelines + cochrane_count + european_guidelines + american_guidelines
         
@@ -462,29 +1040,77 @@ Provide a numbered list of significant findings only:"""
         else:
             return "INSUFFICIENT (No reliable sources found)"
 
-    def generate_report(self, radiology_report: str) -> str:
-        """Generate complete clinical analysis report"""
-        print("🔍 Analyzing radiology report...")
-        print("=" * 60)
-        
-        # Step 1: Extract key findings
-        print("📋 Extracting key clinical findings...")
-        findings = self.extract_key_findings(radiology_report)
-        
-        if not findings:
-            return "No significant clinical findings requiring management identified."
-        
-        print(f"✅ Found {len(findings)} key clinical findings")
-        
-        # Step 2: Search for evidence for each finding
-        all_evidence = []
-        for i, finding in enumerate(findings, 1):
-            print(f"🔬 Searching evidence for finding {i}/{len(findings)}: {finding[:50]}...")
-            evidence = self.search_clinical_evidence(finding)
-            all_evidence.append(evidence)
-        
-        # Step 3: Generate comprehensive report
-        report = f"""
+    def _finding_result(self, finding: str, evidence: Dict[str, Any], recommendations: str) -> Dict[str, Any]:
+        """Bundle a finding's evidence and recommendations with its evidence grade"""
+        add_progress(findings_done=1)
+        return {
+            'finding': finding,
+            'evidence': evidence,
+            'recommendations': recommendations,
+            'evidence_strength': self.format_evidence_strength(evidence['results'])
+        }
+
+    def process_finding(self, finding: str, index: int = 1, total: int = 1) -> Dict[str, Any]:
+        """Run search, recommendations and evidence grading for a single finding"""
+        print(f"🔬 Searching evidence for finding {index}/{total}: {finding[:50]}...")
+        evidence = self.search_clinical_evidence(finding)
+
+        print(f"📝 Generating recommendations for finding {index}...")
+        recommendations = self.generate_recommendations(finding, evidence['results'])
+        return self._finding_result(finding, evidence, recommendations)
+
+    def _recommendation_batches(self, total: int) -> List[List[int]]:
+        """Finding positions grouped for batched recommendation calls"""
+        size = max(1, self.recommendation_batch_size)
+        return [list(range(start, min(start + size, total))) for start in range(0, total, size)]
+
+    def _process_findings_batched(self, findings: List[str]) -> List[Dict[str, Any]]:
+        """Search every finding in parallel, then request recommendations several findings at a time"""
+        total = len(findings)
+        workers = max(1, min(self.max_concurrent_findings, total))
+
+        def search(item):
+            index, finding = item
+            print(f"🔬 Searching evidence for finding {index}/{total}: {finding[:50]}...")
+            return self.search_clinical_evidence(finding)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            evidence = list(executor.map(with_current_context(search), enumerate(findings, 1)))
+
+            batches = self._recommendation_batches(total)
+            print(f"📝 Generating recommendations for {total} findings in {len(batches)} batched calls...")
+            batch_recommendations = list(executor.map(
+                with_current_context(lambda batch: self.generate_batch_recommendations(
+                    [findings[i] for i in batch], [evidence[i]['results'] for i in batch]
+                )),
+                batches
+            ))
+
+        recommendations = [None] * total
+        for batch, texts in zip(batches, batch_recommendations):
+            for i, text in zip(batch, texts):
+                recommendations[i] = text
+
+        return [self._finding_result(findings[i], evidence[i], recommendations[i]) for i in range(total)]
+
+    def _process_findings(self, findings: List[str]) -> List[Dict[str, Any]]:
+        """Process findings in parallel, bounded by max_concurrent_findings, returning results in order"""
+        total = len(findings)
+        if self.batched_recommendations and total > 1:
+            return self._process_findings_batched(findings)
+
+        # Search, recommend and grade each finding as its own task; map() keeps finding order
+        if self.max_concurrent_findings > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrent_findings, total)) as executor:
+                return list(executor.map(
+                    with_current_context(lambda item: self.process_finding(item[1], item[0], total)),
+                    enumerate(findings, 1)
+                ))
+        return [self.process_finding(finding, i, total) for i, finding in enumerate(findings, 1)]
+
+    def _format_report_header(self, radiology_report: str, findings: List[str]) -> str:
+        """Format the report preamble"""
+        return f"""
 NHS RADIOLOGY REPORT CLINICAL ANALYSIS
 Generated: {datetime.now().strftime('%d/%m/%Y %H:%M')}
 {'=' * 60}
@@ -495,37 +1121,56 @@ ORIGINAL REPORT SUMMARY:
 KEY CLINICAL FINDINGS IDENTIFIED: {len(findings)}
 {'=' * 60}
 """
-        
-        for i, (finding, evidence) in enumerate(zip(findings, all_evidence), 1):
-            print(f"📝 Generating recommendations for finding {i}...")
-            
-            recommendations = self.generate_recommendations(finding, evidence['results'])
-            evidence_strength = self.format_evidence_strength(evidence['results'])
-            
-            report += f"""
-FINDING {i}: {finding}
+
+    def _format_finding_section(self, index: int, result: Dict[str, Any]) -> str:
+        """Format one finding's evidence, recommendations and key sources"""
+        evidence = result['evidence']
+        section = f"""
+FINDING {index}: {result['finding']}
 {'-' * 50}
 
-EVIDENCE STRENGTH: {evidence_strength}
+EVIDENCE STRENGTH: {result['evidence_strength']}
 SOURCES FOUND: {evidence['total_sources']}
 
 CLINICAL RECOMMENDATIONS:
-{recommendations}
+{result['recommendations']}
 
 KEY EVIDENCE SOURCES:
 """
-            
-            # Add top 3 sources with links
-            for j, source in enumerate(evidence['results'][:3], 1):
-                report += f"""
+        
+        # Add top 3 sources with links
+        for j, source in enumerate(evidence['results'][:3], 1):
+            section += f"""
 {j}. {source.get('title', 'Unknown Title')}
    URL: {source.get('url', 'No URL available')}
-   Source Type: {self.identify_source_type(source.get('url', ''))}
+   Source Type: {self._source_classification(source).label}
 """
-            
-            report += "\n" + "=" * 60 + "\n"
         
-        report += f"""
+        section += "\n" + "=" * 60 + "\n"
+        return section
+
+    def _finding_payload(self, index: int, result: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON-serialisable view of one processed finding, including its formatted report section"""
+        return {
+            'index': index,
+            'finding': result['finding'],
+            'evidence_strength': result['evidence_strength'],
+            'total_sources': result['evidence']['total_sources'],
+            'recommendations': result['recommendations'],
+            'sources': [
+                {
+                    'title': source.get('title', 'Unknown Title'),
+                    'url': source.get('url', 'No URL available'),
+                    'source_type': self._source_classification(source).label
+                }
+                for source in result['evidence']['results'][:3]
+            ],
+            'section': self._format_finding_section(index, result)
+        }
+
+    def _format_report_summary(self, findings: List[str]) -> str:
+        """Format the closing summary and disclaimer"""
+        return f"""
 SUMMARY:
 - Total findings analyzed: {len(findings)}
 - Evidence-based recommendations provided for each finding
@@ -536,81 +1181,119 @@ DISCLAIMER: This AI analysis is for clinical decision support only.
 Always use clinical judgment and consult colleagues when appropriate.
 All recommendations should be considered within the full clinical context.
 """
-        
+
+    def _assemble_report(self, radiology_report: str, findings: List[str], results: List[Dict[str, Any]]) -> str:
+        """Join the header, per-finding sections (in finding order) and summary"""
+        report = self._format_report_header(radiology_report, findings)
+        for i, result in enumerate(results, 1):
+            report += self._format_finding_section(i, result)
+        report += self._format_report_summary(findings)
         return report
 
-    def identify_source_type(self, url: str) -> str:
-        """Identify the type and authority level of clinical source"""
-        url_lower = url.lower()
+    @report_flow
+    @deadline_bound
+    @timed('report')
+    def generate_report(self, radiology_report: str) -> str:
+        """Generate complete clinical analysis report"""
+        print("🔍 Analyzing radiology report...")
+        print("=" * 60)
         
-        # UK National Guidelines
-        if 'nice.org.uk' in url_lower:
-            return 'NICE Guideline (UK National)'
-        elif 'nhs.uk' in url_lower or 'nhsengland.nhs.uk' in url_lower:
-            return 'NHS Guidance (UK National)'
-        elif 'sign.ac.uk' in url_lower:
-            return 'SIGN Guideline (Scottish)'
-        elif 'gov.uk' in url_lower:
-            return 'UK Government Guidance'
-            
-        # UK Professional Bodies
-        elif 'rcr.ac.uk' in url_lower:
-            return 'Royal College of Radiologists (UK)'
-        elif 'boa.ac.uk' in url_lower:
-            return 'British Orthopaedic Association'
-        elif 'bssr.org.uk' in url_lower:
-            return 'British Society of Skeletal Radiology'
-            
-        # European Guidelines
-        elif 'eular.org' in url_lower:
-            return 'EULAR Guidelines (European)'
-        elif 'myesr.org' in url_lower:
-            return 'European Society of Radiology'
-        elif 'essr.org' in url_lower:
-            return 'European Society of MSK Radiology'
-        elif 'esska.org' in url_lower:
-            return 'European Society Sports/Knee/Arthroscopy'
-            
-        # American Guidelines
-        elif 'acr.org' in url_lower:
-            return 'American College of Radiology'
-        elif 'aaos.org' in url_lower:
-            return 'American Academy Orthopaedic Surgeons'
-        elif 'aossm.org' in url_lower:
-            return 'American Orthopaedic Society Sports Med'
-        elif 'rsna.org' in url_lower:
-            return 'Radiological Society North America'
-            
-        # International Evidence Sources
-        elif 'cochrane' in url_lower:
-            return 'Cochrane Systematic Review'
-        elif 'who.int' in url_lower:
-            return 'World Health Organization'
-            
-        # High-Impact Journals
-        elif 'bmj.com' in url_lower:
-            return 'British Medical Journal'
-        elif 'thelancet.com' in url_lower:
-            return 'The Lancet'
-        elif 'nejm.org' in url_lower:
-            return 'New England Journal of Medicine'
-        elif 'nature.com' in url_lower:
-            return 'Nature Journal'
-            
-        # Research Databases
-        elif 'pubmed' in url_lower or 'ncbi.nlm.nih.gov' in url_lower:
-            return 'PubMed Research Database'
-        elif 'academic.oup.com' in url_lower:
-            return 'Oxford Academic'
-        elif 'springer.com' in url_lower:
-            return 'Springer Academic'
-        elif 'wiley.com' in url_lower:
-            return 'Wiley Academic'
-        elif 'elsevier.com' in url_lower:
-            return 'Elsevier Academic'
-            
+        # Step 1: Extract key findings
+        print("📋 Extracting key clinical findings...")
+        set_progress_stage('extracting findings')
+        findings = self.extract_key_findings(radiology_report)
+        
+        if not findings:
+            return "No significant clinical findings requiring management identified."
+        
+        print(f"✅ Found {len(findings)} key clinical findings")
+        set_progress_stage('analysing findings')
+        add_progress(findings_total=len(findings))
+        
+        # Step 2: Search, recommend and grade the findings in parallel
+        results = self._process_findings(findings)
+        
+        # Step 3: Generate comprehensive report
+        return self._assemble_report(radiology_report, findings, results)
+
+    def _finding_hash(self, finding: str) -> str:
+        """Hash of a finding's normalized text; any change in wording order, certainty or laterality reruns it"""
+        return hashlib.sha1(normalize_finding(finding).encode('utf-8')).hexdigest()[:16]
+
+    def _reusable_result(self, result: Dict[str, Any]) -> bool:
+        """Whether a finding's result is complete enough to keep for the report's next version"""
+        if result.get('recommendations') in (RECOMMENDATIONS_API_ERROR, RECOMMENDATIONS_SYSTEM_ERROR):
+            return False
+        evidence = result.get('evidence') or {}
+        return not (evidence.get('search_failed') or evidence.get('queries_failed') or evidence.get('trimmed'))
+
+    def _plan_incremental(self, report_id: str, findings: List[str]) -> Tuple[List[Optional[Dict[str, Any]]], List[int]]:
+        """Results reused from the report's previous version (None where missing) and the positions to rerun"""
+        previous = {}
+        if self.report_store is not None:
+            previous = self.report_store.get(f"report:{report_id}") or {}
+
+        results: List[Optional[Dict[str, Any]]] = []
+        rerun = []
+        for i, finding in enumerate(findings):
+            result = previous.get(self._finding_hash(finding))
+            if result is None or not self._reusable_result(result):
+                result = None
+                rerun.append(i)
+            else:
+                result = dict(result, finding=finding)
+            results.append(result)
+        return results, rerun
+
+    def _finish_incremental(self, report_id: str, radiology_report: str, findings: List[str],
+                            results: List[Dict[str, Any]], rerun: List[int]) -> Dict[str, Any]:
+        """Store the report's current per-finding results and assemble the rebuilt report"""
+        if self.report_store is not None:
+            previous = self.report_store.get(f"report:{report_id}") or {}
+            hashes = [self._finding_hash(finding) for finding in findings]
+            # Failed, degraded or deadline-trimmed results are rerun next time rather than kept for 30 days
+            current = {key: result for key, result in zip(hashes, results) if self._reusable_result(result)}
+            self.report_store.set(f"report:{report_id}", current)
+            removed = len(set(previous) - set(hashes))
+        else:
+            removed = 0
+
+        if findings:
+            analysis = self._assemble_report(radiology_report, findings, results)
         else:
-            return 'Clinical Source'
+            analysis = "No significant clinical findings requiring management identified."
+
+        print(f"♻️  Reused {len(findings) - len(rerun)} finding(s), reran {len(rerun)}, removed {removed}")
+        return {
+            'report_id': report_id,
+            'analysis': analysis,
+            'findings_reused': len(findings) - len(rerun),
+            'findings_rerun': len(rerun),
+            'findings_removed': removed
+        }
+
+    @report_flow
+    @deadline_bound
+    @timed('incremental_report')
+    def generate_incremental_report(self, report_id: str, radiology_report: str) -> Dict[str, Any]:
+        """Re-analyse an amended report, rerunning search and recommendations only for new or changed findings"""
+        print(f"🔍 Re-analyzing report {report_id}...")
+        set_progress_stage('extracting findings')
+        findings = self.extract_key_findings(radiology_report)
+
+        results, rerun = self._plan_incremental(report_id, findings)
+        set_progress_stage('analysing findings')
+        add_progress(findings_total=len(rerun))
+
+        if rerun:
+            for i, result in zip(rerun, self._process_findings([findings[i] for i in rerun])):
+                results[i] = result
+
+        return self._finish_incremental(report_id, radiology_report, findings, results, rerun)
+
+    def identify_source_type(self, url: str) -> str:
+        """Identify the type and authority level of clinical source"""
+        return classify_url(url).label
 
 def test_with_sample_report():
     """Test function with the knee MRI report"""
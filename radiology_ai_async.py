@@ -0,0 +1,456 @@
+import asyncio
+import time
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+
+import httpx
+
+from cache import content_key
+from findings import merge_duplicate_findings, normalize_finding
+from jobs import add_progress, set_progress_stage
+from metrics import timed
+from providers import (CircuitOpenError, DeadlineExceeded, deadline_bound, report_deadline_seconds,
+                       request_deadline)
+from radiology_ai import RECOMMENDATIONS_API_ERROR, RECOMMENDATIONS_SYSTEM_ERROR, QueryPlanRun, RadiologyClinicalAI
+from result_index import QUERY_FAILED, QUERY_REJECTED, ResultIndex
+from scheduler import EXTRACTION, RECOMMENDATIONS, SEARCH, report_flow, request_tokens, use_flow
+
+
+class AsyncRadiologyClinicalAI(RadiologyClinicalAI):
+    """Non-blocking pipeline: network-bound methods become coroutines, everything else is inherited"""
+
+    async def _post(self, provider: str, url: str, headers: Dict[str, str], data: Dict[str, Any],
+                    stage: int = SEARCH):
+        """Send a JSON POST to a provider API, with quota scheduling, deadline-capped timeouts and retries"""
+        attempt = 0
+        while True:
+            self._admit_call(provider)
+            await self.scheduler.acquire_async(provider, stage, request_tokens(data))
+            connect, read = self._call_timeout(provider)
+            client = self.http.async_client(provider)
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, headers=headers, json=data,
+                                             timeout=httpx.Timeout(read, connect=connect))
+            except httpx.HTTPError:
+                delay = self._failed_call_delay(provider, attempt, started, (connect, read))
+                if delay is None:
+                    raise
+            else:
+                delay = self._response_retry_delay(provider, attempt, started, response)
+                if delay is None:
+                    return response
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        """Release pooled connections and caches"""
+        await self.http.aclose()
+        self.scheduler.close()
+        self._close_caches()
+
+    @timed('extraction')
+    async def extract_key_findings(self, report_text: str) -> List[str]:
+        """Extract key clinical findings from radiology report using Groq as backup"""
+        local_findings = self._local_first_extraction(report_text)
+        if local_findings is not None:
+            return merge_duplicate_findings(local_findings)
+
+        if self.hedged_extraction:
+            findings = await self._extract_hedged(report_text)
+        else:
+            findings = await self._extract_with_cohere(report_text)
+            if not findings:
+                print("Cohere failed, trying with Groq...")
+                findings = await self._extract_with_groq(report_text)
+
+        return merge_duplicate_findings(findings)
+
+    async def _extract_hedged(self, report_text: str) -> List[str]:
+        """Race Groq against Cohere once Cohere is slow or fails, keeping the first non-empty result"""
+        cohere = asyncio.ensure_future(self._extract_with_cohere(report_text))
+        groq = None
+        try:
+            await asyncio.wait({cohere}, timeout=self.extraction_hedge_delay)
+            if cohere.done() and cohere.result():
+                return cohere.result()
+
+            print("Cohere slow or failed, hedging with Groq...")
+            groq = asyncio.ensure_future(self._extract_with_groq(report_text, manual_fallback=False))
+            pending = {groq} if cohere.done() else {cohere, groq}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.result():
+                        return task.result()
+        finally:
+            # Cancel whichever call lost the race
+            for task in (cohere, groq):
+                if task is not None and not task.done():
+                    task.cancel()
+
+        return self._manual_extraction(report_text)
+
+    async def _extract_with(self, provider: str, report_text: str) -> List[str]:
+        """Extract findings with one LLM provider, returning an empty list on failure"""
+        try:
+            url, headers, data = self._extraction_call(provider, report_text)
+
+            findings_text = await asyncio.to_thread(self._cached_llm_response, provider, data)
+            if findings_text is None:
+                findings_text = self._completion_text(provider, await self._post(provider, url, headers, data, EXTRACTION))
+                if findings_text is None:
+                    return []
+                await asyncio.to_thread(self._store_llm_response, provider, data, findings_text)
+            return self._parse_findings(findings_text)
+
+        except Exception as e:
+            print(f"{provider.capitalize()} error: {str(e)}")
+            return []
+
+    async def _extract_with_cohere(self, report_text: str) -> List[str]:
+        """Extract findings using Cohere API"""
+        return await self._extract_with('cohere', report_text)
+
+    async def _extract_with_groq(self, report_text: str, manual_fallback: bool = True) -> List[str]:
+        """Extract findings using Groq API as backup, falling back to manual extraction"""
+        findings = await self._extract_with('groq', report_text)
+        if not findings and manual_fallback:
+            return self._manual_extraction(report_text)
+        return findings
+
+    async def fetch_raw_content(self, results: List[Dict], max_bytes: Optional[int] = None) -> List[Dict]:
+        """Fetch full page text for results on demand, holding at most max_bytes for this call"""
+        data = self._raw_content_request(results)
+        extracted = {}
+        if data is not None:
+            try:
+                extracted = self._extracted_raw_content(
+                    await self._post('tavily', self.tavily_extract_url, {'Content-Type': 'application/json'}, data)
+                )
+            except Exception as e:
+                print(f"Error fetching raw content: {str(e)}")
+        return self._take_raw_content(results, extracted, max_bytes)
+
+    async def _search_query(self, query: str, index: int, total: int) -> Tuple[str, List[Dict]]:
+        """Run a single Tavily query, returning its outcome and results (empty unless it succeeded)"""
+        print(f"Searching query {index}/{total}: {query[:50]}...")
+        try:
+            return self._search_results(await self._post(
+                'tavily', self.tavily_url, {'Content-Type': 'application/json'}, self._build_tavily_request(query)
+            ))
+        except (CircuitOpenError, DeadlineExceeded) as rejected:
+            print(f"Query {index} not sent: {str(rejected)}")
+            return QUERY_REJECTED, []
+        except Exception as query_error:
+            print(f"Error with query {index}: {str(query_error)}")
+            return QUERY_FAILED, []
+
+    async def _run_query_plan(self, queries: List[str]) -> ResultIndex:
+        """Issue queries in priority order, up to max_concurrent_queries at a time, until evidence is sufficient"""
+        plan = QueryPlanRun(self, queries)
+        pending = {}
+
+        try:
+            while True:
+                for position, query in iter(plan.next_query, None):
+                    task = asyncio.ensure_future(self._search_query(query, position + 1, plan.total))
+                    pending[task] = position
+
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    plan.complete(pending.pop(task), *task.result())
+        finally:
+            # Abandon queries still in flight if the plan is interrupted
+            for task in pending:
+                task.cancel()
+
+        return plan.index
+
+    @timed('evidence_search')
+    async def search_clinical_evidence(self, finding: str) -> Dict[str, Any]:
+        """Search for comprehensive clinical evidence using Tavily API"""
+        try:
+            # SQLite cache and corpus access run off the event loop
+            cached = await asyncio.to_thread(lambda: self._cached_evidence(finding) or self._corpus_evidence(finding))
+            if cached is not None:
+                return cached
+
+            evidence = await self.evidence_flights.do_async(
+                self._evidence_cache_key(finding), lambda: self._search_evidence(finding)
+            )
+            return dict(evidence, finding=finding)
+
+        except Exception as e:
+            print(f"Error searching for {finding}: {str(e)}")
+            return {'finding': finding, 'results': [], 'total_sources': 0, 'search_failed': True}
+
+    async def _search_evidence(self, finding: str) -> Dict[str, Any]:
+        """Run the query plan for a finding and compile its evidence"""
+        queries = self._build_search_queries(finding)
+        index = await self._run_query_plan(queries)
+
+        return await asyncio.to_thread(self._compile_evidence, finding, index, len(queries))
+
+    @timed('recommendations')
+    async def generate_recommendations(self, finding: str, search_results: List[Dict]) -> str:
+        """Generate clinical recommendations using Groq"""
+        try:
+            headers = self._auth_headers(self.groq_api_key)
+            data = self._build_recommendation_request(finding, search_results)
+
+            cached_text = await asyncio.to_thread(self._cached_llm_response, 'groq', data)
+            if cached_text is not None:
+                return cached_text
+
+            return await self.recommendation_flights.do_async(
+                content_key('llm:groq', data), lambda: self._request_recommendations(headers, data)
+            )
+
+        except Exception as e:
+            print(f"Error generating recommendations: {str(e)}")
+            return RECOMMENDATIONS_SYSTEM_ERROR
+
+    async def _request_recommendations(self, headers: Dict[str, str], data: Dict[str, Any]) -> str:
+        """Send a recommendation request to Groq and cache the completion"""
+        recommendations = self._completion_text(
+            'groq', await self._post('groq', self.groq_url, headers, data, RECOMMENDATIONS)
+        )
+        if recommendations is None:
+            return RECOMMENDATIONS_API_ERROR
+        await asyncio.to_thread(self._store_llm_response, 'groq', data, recommendations)
+        return recommendations
+
+    @timed('batch_recommendations')
+    async def generate_batch_recommendations(self, findings: List[str], evidence_lists: List[List[Dict]]) -> List[str]:
+        """Recommendations for several findings from one Groq call, falling back per finding if parsing fails"""
+        sections: List[Optional[str]] = [None] * len(findings)
+        try:
+            headers = self._auth_headers(self.groq_api_key)
+            data = self._build_batch_recommendation_request(findings, evidence_lists)
+
+            text = await asyncio.to_thread(self._cached_llm_response, 'groq', data)
+            if text is None:
+                text = self._completion_text(
+                    'groq', await self._post('groq', self.groq_url, headers, data, RECOMMENDATIONS)
+                )
+
+            if text is not None:
+                sections = self._parse_batch_recommendations(text, len(findings))
+                if all(sections):
+                    await asyncio.to_thread(self._store_llm_response, 'groq', data, text)
+
+        except Exception as e:
+            print(f"Error generating batched recommendations: {str(e)}")
+
+        missing = self._missing_sections(sections)
+        if missing:
+            fallbacks = await asyncio.gather(
+                *(self.generate_recommendations(findings[i], evidence_lists[i]) for i in missing)
+            )
+            for i, fallback in zip(missing, fallbacks):
+                sections[i] = fallback
+        return sections
+
+    async def process_finding(self, finding: str, index: int = 1, total: int = 1) -> Dict[str, Any]:
+        """Run search, recommendations and evidence grading for a single finding"""
+        print(f"🔬 Searching evidence for finding {index}/{total}: {finding[:50]}...")
+        evidence = await self.search_clinical_evidence(finding)
+
+        print(f"📝 Generating recommendations for finding {index}...")
+        recommendations = await self.generate_recommendations(finding, evidence['results'])
+        return self._finding_result(finding, evidence, recommendations)
+
+    @report_flow
+    @deadline_bound
+    @timed('report')
+    async def generate_report(self, radiology_report: str) -> str:
+        """Generate complete clinical analysis report"""
+        print("🔍 Analyzing radiology report...")
+        print("=" * 60)
+
+        print("📋 Extracting key clinical findings...")
+        set_progress_stage('extracting findings')
+        findings = await self.extract_key_findings(radiology_report)
+
+        if not findings:
+            return "No significant clinical findings requiring management identified."
+
+        print(f"✅ Found {len(findings)} key clinical findings")
+        set_progress_stage('analysing findings')
+        add_progress(findings_total=len(findings))
+
+        results = await self._process_findings(findings)
+
+        return self._assemble_report(radiology_report, findings, results)
+
+    async def _process_findings(self, findings: List[str]) -> List[Dict[str, Any]]:
+        """Process findings concurrently, bounded by max_concurrent_findings, returning results in order"""
+        total = len(findings)
+        if self.batched_recommendations and total > 1:
+            return await self._process_findings_batched(findings)
+
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrent_findings))
+
+        async def bounded_finding(index: int, finding: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.process_finding(finding, index, total)
+
+        results = await asyncio.gather(
+            *(bounded_finding(i, finding) for i, finding in enumerate(findings, 1))
+        )
+        return list(results)
+
+    async def _process_findings_batched(self, findings: List[str]) -> List[Dict[str, Any]]:
+        """Search every finding concurrently, then request recommendations several findings at a time"""
+        total = len(findings)
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrent_findings))
+
+        async def bounded_search(index: int, finding: str) -> Dict[str, Any]:
+            async with semaphore:
+                print(f"🔬 Searching evidence for finding {index}/{total}: {finding[:50]}...")
+                return await self.search_clinical_evidence(finding)
+
+        evidence = await asyncio.gather(
+            *(bounded_search(i, finding) for i, finding in enumerate(findings, 1))
+        )
+
+        batches = self._recommendation_batches(total)
+        print(f"📝 Generating recommendations for {total} findings in {len(batches)} batched calls...")
+        batch_recommendations = await asyncio.gather(*(
+            self.generate_batch_recommendations([findings[i] for i in batch], [evidence[i]['results'] for i in batch])
+            for batch in batches
+        ))
+
+        recommendations = [None] * total
+        for batch, texts in zip(batches, batch_recommendations):
+            for i, text in zip(batch, texts):
+                recommendations[i] = text
+
+        return [self._finding_result(findings[i], evidence[i], recommendations[i]) for i in range(total)]
+
+    @report_flow
+    @deadline_bound
+    @timed('incremental_report')
+    async def generate_incremental_report(self, report_id: str, radiology_report: str) -> Dict[str, Any]:
+        """Re-analyse an amended report, rerunning search and recommendations only for new or changed findings"""
+        print(f"🔍 Re-analyzing report {report_id}...")
+        set_progress_stage('extracting findings')
+        findings = await self.extract_key_findings(radiology_report)
+
+        # Report store access runs off the event loop
+        results, rerun = await asyncio.to_thread(self._plan_incremental, report_id, findings)
+        set_progress_stage('analysing findings')
+        add_progress(findings_total=len(rerun))
+
+        if rerun:
+            for i, result in zip(rerun, await self._process_findings([findings[i] for i in rerun])):
+                results[i] = result
+
+        return await asyncio.to_thread(self._finish_incremental, report_id, radiology_report, findings, results, rerun)
+
+    @report_flow
+    async def generate_batch_reports(self, radiology_reports: List[str]) -> Dict[str, Any]:
+        """Analyse many reports, searching and recommending once per distinct finding across the batch"""
+        print(f"🔍 Analyzing batch of {len(radiology_reports)} reports...")
+        # Each report's work runs under its own request deadline, started when that work starts, so a
+        # large batch is not trimmed to fit one report's budget
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrent_batch_reports))
+
+        async def within_report_deadline(work):
+            async with semaphore:
+                with request_deadline(report_deadline_seconds(self.request_deadline_seconds)):
+                    return await work
+
+        report_findings = await asyncio.gather(
+            *(within_report_deadline(self.extract_key_findings(report)) for report in radiology_reports)
+        )
+
+        # One representative wording per normalized finding (word order, certainty and laterality kept,
+        # so results are only shared between patients when the findings really are the same), searched
+        # and recommended as part of the first report it appears in
+        unique_findings = {}
+        owned = [[] for _ in radiology_reports]
+        for position, findings in enumerate(report_findings):
+            for finding in findings:
+                key = normalize_finding(finding)
+                if key not in unique_findings:
+                    unique_findings[key] = finding
+                    owned[position].append(key)
+
+        total_findings = sum(len(findings) for findings in report_findings)
+        print(f"✅ {total_findings} findings across batch, {len(unique_findings)} unique")
+
+        owned = [keys for keys in owned if keys]
+        owned_results = await asyncio.gather(
+            *(within_report_deadline(self._process_findings([unique_findings[key] for key in keys])) for keys in owned)
+        )
+        results_by_key = {}
+        for keys, results in zip(owned, owned_results):
+            results_by_key.update(zip(keys, results))
+
+        analyses = []
+        for report, findings in zip(radiology_reports, report_findings):
+            if not findings:
+                analyses.append("No significant clinical findings requiring management identified.")
+                continue
+            # Shared results are relabelled with each report's own wording
+            report_results = [
+                dict(results_by_key[normalize_finding(finding)], finding=finding)
+                for finding in findings
+            ]
+            analyses.append(self._assemble_report(report, findings, report_results))
+
+        return {
+            'analyses': analyses,
+            'total_findings': total_findings,
+            'unique_findings': len(unique_findings)
+        }
+
+    async def stream_report(self, radiology_report: str, heartbeat_seconds: float = 15.0) -> AsyncIterator[Dict[str, Any]]:
+        """Yield 'findings', then one 'finding' event per finding as it completes, then 'summary'.
+
+        'ping' events are emitted while waiting so idle connections are not dropped by proxies.
+        """
+        # A generator cannot hold a context across yields, so the flow and deadline are entered per phase
+        deadline_seconds = report_deadline_seconds(self.request_deadline_seconds)
+        with use_flow() as flow, request_deadline(deadline_seconds) as deadline:
+            findings = await self.extract_key_findings(radiology_report)
+        yield {'event': 'findings', 'data': {'findings': findings}}
+
+        if not findings:
+            yield {'event': 'summary', 'data': {
+                'total_findings': 0,
+                'summary': "No significant clinical findings requiring management identified."
+            }}
+            return
+
+        total = len(findings)
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrent_findings))
+
+        async def bounded_finding(index: int, finding: str):
+            async with semaphore:
+                return index, await self.process_finding(finding, index, total)
+
+        with use_flow(flow), request_deadline(at=deadline):
+            pending = {asyncio.ensure_future(bounded_finding(i, finding)) for i, finding in enumerate(findings, 1)}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=heartbeat_seconds,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    yield {'event': 'ping', 'data': {}}
+                for task in done:
+                    index, result = task.result()
+                    yield {'event': 'finding', 'data': self._finding_payload(index, result)}
+        finally:
+            # Stop outstanding work if the client disconnects mid-stream
+            for task in pending:
+                task.cancel()
+
+        yield {'event': 'summary', 'data': {
+            'total_findings': total,
+            'summary': self._format_report_summary(findings)
+        }}
@@ -0,0 +1,160 @@
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from domains import DomainInfo, classify_url
+
+# Click and analytics identifiers that never change the page content (utm_* is stripped too); generic
+# names such as 'source' or 'ref' are kept because some journal sites use them to select content
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', 'igshid'
+}
+
+# Host prefixes that serve the same page as the bare host
+_HOST_PREFIXES = ('www.', 'm.', 'mobile.')
+
+# Equivalent article locations across NCBI hosts, rewritten to one form
+_HOST_PATH_ALIASES = [
+    (re.compile(r'^ncbi\.nlm\.nih\.gov/pubmed/(\d+)'), lambda m: f'pubmed.ncbi.nlm.nih.gov/{m.group(1)}'),
+    (re.compile(r'^ncbi\.nlm\.nih\.gov/pmc/articles/pmc(\d+)', re.IGNORECASE),
+     lambda m: f'pmc.ncbi.nlm.nih.gov/articles/PMC{m.group(1)}'),
+    (re.compile(r'^europepmc\.org/(?:abstract/med|article/med)/(\d+)', re.IGNORECASE),
+     lambda m: f'pubmed.ncbi.nlm.nih.gov/{m.group(1)}'),
+]
+
+# Query outcomes counted by ResultIndex.add_query_results
+QUERY_OK = 'ok'
+QUERY_FAILED = 'failed'        # Error response, or an exception once retries were exhausted
+QUERY_REJECTED = 'rejected'    # Never sent: the provider's circuit was open or the request deadline had passed
+
+# Leading content compared when fingerprinting, so differently trimmed copies still match
+CONTENT_FINGERPRINT_CHARS = 300
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def canonicalize_url(url: str) -> str:
+    """Scheme-less URL with a lower-cased host, without tracking parameters, fragments or trailing slashes
+
+    Paths and query values keep their case: many CMS and DOI paths are case-sensitive.
+    """
+    if not url:
+        return ''
+    try:
+        parts = urlsplit(url if '//' in url else '//' + url)
+        host = (parts.hostname or '').rstrip('.')
+    except ValueError:
+        return url.strip()
+
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/')
+    if path.endswith(('/index.html', '/index.htm', '/index.php')):
+        path = path.rsplit('/', 1)[0]
+
+    params = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_')
+    )
+
+    canonical = host + path
+    for pattern, replacement in _HOST_PATH_ALIASES:
+        canonical = pattern.sub(replacement, canonical)
+
+    if params:
+        canonical += '?' + urlencode(params)
+    return canonical
+
+
+def _text_fingerprint(text: str) -> Optional[int]:
+    normalized = _NON_WORD.sub(' ', text.lower()).strip()
+    return zlib.crc32(normalized.encode()) if normalized else None
+
+
+class ResultIndex:
+    """Search-wide result set deduplicated by canonical URL, title and content fingerprints.
+
+    Each add() is O(1). Results are returned in the order they would appear if
+    queries were merged in plan order, whatever order they actually arrived in.
+    """
+
+    def __init__(self):
+        self.tier_counts: Counter = Counter()
+        self.duplicates = 0
+        self.queries_run = 0         # Queries answered successfully
+        self.queries_failed = 0
+        self.queries_rejected = 0
+
+        self._entries: Dict[int, list] = {}   # entry id -> [order, result, classification]
+        self._keys: Dict[Tuple[str, object], int] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _fingerprints(self, result: Dict) -> List[Tuple[str, object]]:
+        keys = []
+        url = canonicalize_url(result.get('url') or '')
+        if url:
+            keys.append(('url', url))
+
+        # Content alone is not enough: boilerplate snippets repeat across unrelated pages
+        content_print = _text_fingerprint((result.get('content') or '')[:CONTENT_FINGERPRINT_CHARS])
+        title_print = _text_fingerprint(result.get('title') or '')
+        if title_print is not None and content_print is not None:
+            keys.append(('title+content', (title_print, content_print)))
+        return keys
+
+    def add(self, result: Dict, order: Tuple[int, int]) -> bool:
+        """Add one result at (query position, rank); returns False if it duplicated an existing one"""
+        keys = self._fingerprints(result)
+        info = classify_url(result.get('url') or '')
+
+        existing_id = next((self._keys[key] for key in keys if key in self._keys), None)
+        if existing_id is None:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = [order, result, info]
+            self.tier_counts[info.tier] += 1
+            for key in keys:
+                self._keys[key] = entry_id
+            return True
+
+        # Duplicate: keep the earliest position and the more authoritative copy
+        self.duplicates += 1
+        entry = self._entries[existing_id]
+        entry[0] = min(entry[0], order)
+        current: DomainInfo = entry[2]
+        if info.priority > current.priority:
+            self.tier_counts[current.tier] -= 1
+            self.tier_counts[info.tier] += 1
+            entry[1] = result
+            entry[2] = info
+        for key in keys:
+            self._keys.setdefault(key, existing_id)
+        return False
+
+    @property
+    def queries_issued(self) -> int:
+        """Queries attempted, whatever their outcome"""
+        return self.queries_run + self.queries_failed + self.queries_rejected
+
+    def add_query_results(self, query_position: int, results: List[Dict], outcome: str = QUERY_OK):
+        """Add every result returned by one query, counting the query under its outcome"""
+        if outcome == QUERY_FAILED:
+            self.queries_failed += 1
+        elif outcome == QUERY_REJECTED:
+            self.queries_rejected += 1
+        else:
+            self.queries_run += 1
+        for rank, result in enumerate(results):
+            self.add(result, (query_position, rank))
+
+    def results(self) -> List[Dict]:
+        """Distinct results in query-plan order"""
+        return [entry[1] for entry in sorted(self._entries.values(), key=lambda entry: entry[0])]
@@ -0,0 +1,284 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from evidence_prompt import estimate_tokens
+from metrics import record_request_timing
+
+# Request classes: interactive analyses are granted before batch work
+INTERACTIVE = 0
+BATCH = 1
+
+# Call stages, granted in this order within a request class
+EXTRACTION = 0
+RECOMMENDATIONS = 1
+SEARCH = 2
+
+STAGE_NAMES = {EXTRACTION: 'extraction', RECOMMENDATIONS: 'recommendations', SEARCH: 'search'}
+
+
+class ProviderQuota(NamedTuple):
+    requests_per_second: float           # Sustained request rate (0 disables scheduling for the provider)
+    burst: int = 1                       # Requests that may be sent back to back
+    tokens_per_minute: Optional[int] = None  # LLM token budget, prompt estimate plus max_tokens
+
+
+DEFAULT_QUOTAS = {
+    'tavily': ProviderQuota(requests_per_second=10.0, burst=20),
+    'cohere': ProviderQuota(requests_per_second=10.0, burst=10, tokens_per_minute=100_000),
+    'groq': ProviderQuota(requests_per_second=10.0, burst=20, tokens_per_minute=300_000)
+}
+
+
+class Flow:
+    """One report's share of the scheduler; calls from different flows are interleaved fairly"""
+
+    def __init__(self, request_class: int = INTERACTIVE):
+        self.request_class = request_class
+        self.finish_tags: Dict[str, float] = {}
+
+
+_request_class: contextvars.ContextVar[int] = contextvars.ContextVar('request_class', default=INTERACTIVE)
+_current_flow: contextvars.ContextVar[Optional[Flow]] = contextvars.ContextVar('scheduler_flow', default=None)
+_shared_flow = Flow()
+
+
+@contextmanager
+def request_priority(request_class: int) -> Iterator[None]:
+    """Run everything inside the block, and reports started there, at the given request class"""
+    token = _request_class.set(request_class)
+    try:
+        yield
+    finally:
+        _request_class.reset(token)
+
+
+@contextmanager
+def use_flow(flow: Optional[Flow] = None) -> Iterator[Flow]:
+    """Schedule calls made inside the block (and tasks or threads started there) as one report's flow"""
+    flow = flow or Flow(_request_class.get())
+    token = _current_flow.set(flow)
+    try:
+        yield flow
+    finally:
+        _current_flow.reset(token)
+
+
+def report_flow(fn: Callable) -> Callable:
+    """Decorate a pipeline entry point (sync or async) so each call is scheduled as its own flow"""
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with use_flow():
+                return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with use_flow():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def request_tokens(data: Dict[str, Any]) -> int:
+    """Estimated tokens a provider request consumes: prompt text plus the completion allowance"""
+    prompt = data.get('prompt') or ''.join(message.get('content', '') for message in data.get('messages', []))
+    return (estimate_tokens(prompt) + int(data.get('max_tokens') or 0)) if prompt else 0
+
+
+class TokenBucket:
+    """Token bucket refilled continuously; not locked, the scheduler serialises access"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def delay(self, cost: float, now: float) -> float:
+        """Seconds until cost tokens are available (costs above capacity wait for a full bucket)"""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        cost = min(cost, self.capacity)
+        return 0.0 if self._tokens >= cost else (cost - self._tokens) / self.rate
+
+    def take(self, cost: float):
+        self._tokens -= min(cost, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ('provider', 'stage', 'tokens', 'release', 'cancelled')
+
+    def __init__(self, provider: str, stage: int, tokens: int, release: Callable[[], None]):
+        self.provider = provider
+        self.stage = stage
+        self.tokens = tokens
+        self.release = release
+        self.cancelled = False
+
+
+class ProviderScheduler:
+    """Process-wide provider quotas with priority and per-report fairness.
+
+    Each provider has a request-rate bucket and, for LLMs, a tokens-per-minute
+    bucket. Calls that cannot go straight away queue per provider and are
+    granted by (request class, stage, fair-queueing tag): interactive before
+    batch, extraction before recommendations before guideline searches, and
+    within those, start-time fair queueing round-robins between reports so a
+    large report cannot starve the others. One dispatcher thread grants
+    queued calls to both blocking callers and event-loop coroutines.
+    """
+
+    def __init__(self, quotas: Optional[Dict[str, ProviderQuota]] = None, metrics=None):
+        self.quotas = dict(DEFAULT_QUOTAS, **(quotas or {}))
+        self.metrics = metrics
+
+        self._buckets: Dict[str, List[TokenBucket]] = {}
+        self._queues: Dict[str, list] = {}
+        self._virtual_time: Dict[str, float] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _provider_buckets(self, provider: str) -> List[TokenBucket]:
+        buckets = self._buckets.get(provider)
+        if buckets is None:
+            quota = self.quotas[provider]
+            buckets = [TokenBucket(quota.requests_per_second, quota.burst)]
+            if quota.tokens_per_minute:
+                buckets.append(TokenBucket(quota.tokens_per_minute / 60.0, quota.tokens_per_minute))
+            self._buckets[provider] = buckets
+        return buckets
+
+    def _delay(self, provider: str, tokens: int, now: float) -> float:
+        request_bucket, *token_buckets = self._provider_buckets(provider)
+        delays = [request_bucket.delay(1, now)] + [bucket.delay(tokens, now) for bucket in token_buckets]
+        return max(delays)
+
+    def _take(self, provider: str, tokens: int):
+        request_bucket, *token_buckets = self._provider_buckets(provider)
+        request_bucket.take(1)
+        for bucket in token_buckets:
+            bucket.take(tokens)
+
+    def _enabled(self, provider: str) -> bool:
+        quota = self.quotas.get(provider)
+        return quota is not None and quota.requests_per_second > 0
+
+    def _enqueue(self, provider: str, stage: int, tokens: int, release: Callable[[], None]) -> Optional[_Waiter]:
+        """Grant immediately (returning None) when nothing is queued and quota allows, else queue a waiter"""
+        flow = _current_flow.get() or _shared_flow
+        with self._condition:
+            queue = self._queues.setdefault(provider, [])
+            if self._closed:
+                return None
+            if not queue and self._delay(provider, tokens, time.monotonic()) <= 0:
+                self._take(provider, tokens)
+                return None
+
+            # Start-time fair queueing: a flow's next call starts where its previous one finished
+            start = max(self._virtual_time.get(provider, 0.0), flow.finish_tags.get(provider, 0.0))
+            flow.finish_tags[provider] = start + 1
+            waiter = _Waiter(provider, stage, tokens, release)
+            heapq.heappush(queue, (flow.request_class, stage, start, next(self._sequence), waiter))
+            self._set_depth(provider, len(queue))
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name='provider-scheduler', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+            return waiter
+
+    def _set_depth(self, provider: str, depth: int):
+        if self.metrics is not None:
+            self.metrics.set_gauge('scheduler_queue_depth', depth, {'provider': provider})
+
+    def _dispatch(self):
+        with self._condition:
+            while not self._closed:
+                timeout = None
+                now = time.monotonic()
+                for provider, queue in self._queues.items():
+                    while queue:
+                        _, _, start, _, waiter = queue[0]
+                        if waiter.cancelled:
+                            heapq.heappop(queue)
+                            continue
+                        delay = self._delay(provider, waiter.tokens, now)
+                        if delay > 0:
+                            timeout = delay if timeout is None else min(timeout, delay)
+                            break
+                        heapq.heappop(queue)
+                        self._take(provider, waiter.tokens)
+                        self._virtual_time[provider] = start
+                        waiter.release()
+                    self._set_depth(provider, len(queue))
+                self._condition.wait(timeout)
+
+    def _observe_wait(self, provider: str, stage: int, seconds: float):
+        record_request_timing(f'queue.{provider}', seconds)
+        if self.metrics is not None:
+            self.metrics.observe('scheduler_wait_seconds', seconds,
+                                 {'provider': provider, 'stage': STAGE_NAMES.get(stage, str(stage))})
+
+    def acquire(self, provider: str, stage: int = SEARCH, tokens: int = 0):
+        """Block the calling thread until a call to provider may be sent"""
+        if not self._enabled(provider):
+            return
+        started = time.monotonic()
+        event = threading.Event()
+        waiter = self._enqueue(provider, stage, tokens, event.set)
+        if waiter is not None:
+            event.wait()
+            self._observe_wait(provider, stage, time.monotonic() - started)
+
+    async def acquire_async(self, provider: str, stage: int = SEARCH, tokens: int = 0):
+        """Wait without blocking the event loop until a call to provider may be sent"""
+        if not self._enabled(provider):
+            return
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def release():
+            try:
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+            except RuntimeError:
+                pass  # Loop already closed
+
+        waiter = self._enqueue(provider, stage, tokens, release)
+        if waiter is None:
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._condition:
+                waiter.cancelled = True
+            raise
+        self._observe_wait(provider, stage, time.monotonic() - started)
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Calls currently waiting per provider"""
+        with self._condition:
+            return {provider: sum(1 for entry in queue if not entry[-1].cancelled)
+                    for provider, queue in self._queues.items()}
+
+    def close(self):
+        """Stop the dispatcher thread; queued callers are released immediately"""
+        with self._condition:
+            self._closed = True
+            for queue in self._queues.values():
+                for entry in queue:
+                    entry[-1].release()
+                queue.clear()
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from domains import DOMAIN_REGISTRY
+
+
+class ProviderProfile(NamedTuple):
+    latency: float = 0.05          # Mean response latency in seconds
+    jitter: float = 0.02           # Uniform +/- spread around the mean
+    error_rate: float = 0.0        # Share of calls answered with HTTP 500
+    rate_limit_rate: float = 0.0   # Share of calls answered with HTTP 429
+    retry_after: float = 1.0       # Retry-After seconds sent with 429s
+    payload_bytes: int = 1000      # Approximate text size per result / generation
+
+
+DEFAULT_PROFILES = {
+    'tavily': ProviderProfile(latency=0.3, jitter=0.1, payload_bytes=1500),
+    'cohere': ProviderProfile(latency=0.8, jitter=0.2, payload_bytes=300),
+    'groq': ProviderProfile(latency=1.5, jitter=0.5, payload_bytes=2500)
+}
+
+SAMPLE_FINDINGS = [
+    "Horizontal tear of the medial meniscus posterior horn with displaced flap",
+    "Partial thickness tear of the anterior cruciate ligament",
+    "Moderate medial tibiofemoral chondropathy, 1.5cm partial thickness",
+    "Small joint effusion",
+    "Bone marrow oedema in the lateral femoral condyle",
+    "Grade 2 sprain of the medial collateral ligament",
+    "Baker's cyst measuring 3cm",
+    "Patellar tendinopathy at the inferior pole"
+]
+
+# Registered domains in registry order, so stub results span every evidence tier
+_DOMAINS = list(DOMAIN_REGISTRY)
+
+_FILLER = ("Guideline recommendation for assessment and management with imaging follow-up, "
+           "referral criteria and patient information based on systematic review evidence. ")
+
+
+def _filler(seed: str, size: int) -> str:
+    """Deterministic pseudo-prose of roughly size characters, distinct per seed"""
+    text = f"{seed}. "
+    while len(text) < size:
+        text += f"{hashlib.md5((seed + str(len(text))).encode()).hexdigest()[:8]} {_FILLER}"
+    return text[:size]
+
+
+class StubProviders:
+    """Local HTTP stand-ins for Tavily, Cohere and Groq with configurable latency and failures.
+
+    Endpoints mirror the real request and response shapes; point a pipeline at
+    them with configure(). Each provider draws latency and failures from its own
+    ProviderProfile using a seeded generator, so runs are repeatable.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, ProviderProfile]] = None, results_per_query: int = 5,
+                 findings_per_report: int = 4, seed: int = 0, host: str = '127.0.0.1', port: int = 0):
+        self.profiles = dict(DEFAULT_PROFILES, **(profiles or {}))
+        self.results_per_query = results_per_query
+        self.findings_per_report = findings_per_report
+
+        # Served-call accounting: (provider, status) -> count, and response bytes per provider
+        self.calls: Counter = Counter()
+        self.response_bytes: Counter = Counter()
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'StubProviders':
+        """Serve on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'StubProviders':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def configure(self, ai):
+        """Point a RadiologyClinicalAI (or subclass) at these stubs"""
+        ai.tavily_url = f"{self.base_url}/search"
+        ai.tavily_extract_url = f"{self.base_url}/extract"
+        ai.cohere_url = f"{self.base_url}/v1/generate"
+        ai.groq_url = f"{self.base_url}/openai/v1/chat/completions"
+
+    def stats(self) -> Dict[str, Any]:
+        """Calls served per provider and status, and response bytes per provider"""
+        with self._lock:
+            return {
+                'calls': {f"{provider}:{status}": count for (provider, status), count in sorted(self.calls.items())},
+                'response_bytes': dict(self.response_bytes)
+            }
+
+    def _draw(self, provider: str) -> Tuple[float, int]:
+        """Latency and status code for one call"""
+        profile = self.profiles[provider]
+        with self._lock:
+            latency = max(0.0, profile.latency + self._random.uniform(-profile.jitter, profile.jitter))
+            roll = self._random.random()
+        if roll < profile.rate_limit_rate:
+            return latency, 429
+        if roll < profile.rate_limit_rate + profile.error_rate:
+            return latency, 500
+        return latency, 200
+
+    def _search_response(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        query = data.get('query', '')
+        size = self.profiles['tavily'].payload_bytes
+        digest = int(hashlib.md5(query.encode()).hexdigest(), 16)
+        results = []
+        for rank in range(self.results_per_query):
+            domain = _DOMAINS[(digest + rank * 7) % len(_DOMAINS)]
+            page = (digest >> 8) % 13 + rank
+            result = {
+                'title': f"{query[:60]} - {domain} ({page})",
+                'url': f"https://www.{domain}/guidance/{page}",
+                'content': _filler(f"{domain} {page}", size),
+                'score': round(1.0 - rank * 0.1, 2)
+            }
+            if data.get('include_raw_content'):
+                result['raw_content'] = _filler(f"raw {domain} {page}", size * 4)
+            results.append(result)
+        return {'query': query, 'results': results}
+
+    def _extract_response(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        size = self.profiles['tavily'].payload_bytes * 4
+        return {'results': [{'url': url, 'raw_content': _filler(f"raw {url}", size)} for url in data.get('urls', [])]}
+
+    def _findings_text(self) -> str:
+        return '\n'.join(f"{i}. {finding}" for i, finding in
+                         enumerate(SAMPLE_FINDINGS[:self.findings_per_report], 1))
+
+    def _cohere_response(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {'id': 'stub', 'generations': [{'id': 'stub', 'text': self._findings_text()}]}
+
+    def _groq_response(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = ' '.join(message.get('content', '') for message in data.get('messages', []))
+        size = self.profiles['groq'].payload_bytes
+        if 'numbered list' in prompt:
+            content = self._findings_text()
+        elif '### FINDING' in prompt:
+            count = prompt.count('FINDING ') - 1
+            content = '\n'.join(f"### FINDING {i}\n{_filler(f'recommendation {i}', size)}"
+                                for i in range(1, max(count, 1) + 1))
+        else:
+            content = _filler('recommendation', size)
+        return {
+            'id': 'stub',
+            'object': 'chat.completion',
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}]
+        }
+
+    def _route(self, path: str) -> Optional[Tuple[str, Any]]:
+        routes = {
+            '/search': ('tavily', self._search_response),
+            '/extract': ('tavily', self._extract_response),
+            '/v1/generate': ('cohere', self._cohere_response),
+            '/openai/v1/chat/completions': ('groq', self._groq_response)
+        }
+        return routes.get(path)
+
+    def _handler_class(self):
+        stubs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    data = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    data = {}
+
+                route = stubs._route(self.path)
+                if route is None:
+                    self._send(404, {'error': 'not found'})
+                    return
+
+                provider, respond = route
+                latency, status = stubs._draw(provider)
+                time.sleep(latency)
+
+                headers: List[Tuple[str, str]] = []
+                if status == 429:
+                    headers.append(('Retry-After', f"{stubs.profiles[provider].retry_after:g}"))
+                    body = {'error': 'rate limit exceeded'}
+                elif status == 500:
+                    body = {'error': 'internal server error'}
+                else:
+                    body = respond(data)
+
+                sent = self._send(status, body, headers)
+                with stubs._lock:
+                    stubs.calls[(provider, status)] += 1
+                    stubs.response_bytes[provider] += sent
+
+            def _send(self, status: int, body: Dict[str, Any], headers: Optional[List[Tuple[str, str]]] = None) -> int:
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers or []:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+                return len(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
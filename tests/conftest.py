@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Run the test from an empty directory so pipelines create their caches there"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def ai(cache_dir):
+    from radiology_ai import RadiologyClinicalAI
+
+    pipeline = RadiologyClinicalAI()
+    yield pipeline
+    pipeline.close()
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from providers import remaining_time
+from radiology_ai_async import AsyncRadiologyClinicalAI
+
+
+@pytest.fixture
+def async_ai(cache_dir):
+    pipeline = AsyncRadiologyClinicalAI()
+    yield pipeline
+    asyncio.run(pipeline.aclose())
+
+
+def test_batch_shares_work_only_for_identical_findings(async_ai, monkeypatch):
+    extracted = {
+        'report 1': ["Possible metastasis", "Left femoral neck fracture"],
+        'report 2': ["Metastasis", "left femoral neck fracture."],
+    }
+    processed = []
+
+    async def extract(report):
+        return extracted[report]
+
+    async def process(findings):
+        processed.extend(findings)
+        return [{'finding': finding, 'evidence': {'results': [], 'total_sources': 0},
+                 'recommendations': f"recommendations for {finding}", 'evidence_strength': 'WEAK'}
+                for finding in findings]
+
+    monkeypatch.setattr(async_ai, 'extract_key_findings', extract)
+    monkeypatch.setattr(async_ai, '_process_findings', process)
+
+    result = asyncio.run(async_ai.generate_batch_reports(['report 1', 'report 2']))
+
+    assert processed == ["Possible metastasis", "Left femoral neck fracture", "Metastasis"]
+    assert result['unique_findings'] == 3
+    assert "recommendations for Metastasis" in result['analyses'][1]
+    assert "recommendations for Possible metastasis" not in result['analyses'][1]
+
+
+def test_each_report_in_a_batch_gets_its_own_deadline(async_ai, monkeypatch):
+    async_ai.request_deadline_seconds = 1.0
+    async_ai.max_concurrent_batch_reports = 1
+    budgets = []
+
+    async def extract(report):
+        return [f"Finding in {report}"]
+
+    async def process(findings):
+        budgets.append(remaining_time())
+        await asyncio.sleep(0.6)
+        return [{'finding': finding, 'evidence': {'results': [], 'total_sources': 0},
+                 'recommendations': '', 'evidence_strength': 'WEAK'} for finding in findings]
+
+    monkeypatch.setattr(async_ai, 'extract_key_findings', extract)
+    monkeypatch.setattr(async_ai, '_process_findings', process)
+
+    asyncio.run(async_ai.generate_batch_reports(['report 1', 'report 2', 'report 3']))
+
+    # Run one after another for 1.8 s in total, yet each started with (nearly) the full second
+    assert len(budgets) == 3 and all(budget > 0.9 for budget in budgets)
@@ -0,0 +1,46 @@
+import time
+
+from corpus import GuidelineCorpus
+
+
+def document(url, title, content, age_days=0.0):
+    return {'title': title, 'url': url, 'content': content, 'score': 0.8,
+            'fetched_at': time.time() - age_days * 24 * 3600, 'findings': []}
+
+
+def build(tmp_path, documents):
+    GuidelineCorpus.build(str(tmp_path), documents)
+    return GuidelineCorpus.load(str(tmp_path))
+
+
+def test_search_ranks_matching_documents_first(tmp_path):
+    corpus = build(tmp_path, [
+        document("https://a.org/1", "Meniscal tear management", "Arthroscopy for displaced meniscal tear"),
+        document("https://a.org/2", "Pulmonary embolism", "Anticoagulation for pulmonary embolism"),
+        document("https://a.org/3", "Knee effusion", "Aspiration of joint effusion"),
+    ])
+    try:
+        ranked = corpus.search("medial meniscus tear")
+        assert corpus.document(ranked[0][2])['url'] == "https://a.org/1"
+        assert all(corpus.document(doc_id)['url'] != "https://a.org/2" for _, _, doc_id in ranked)
+    finally:
+        corpus.close()
+
+
+def test_evidence_needs_enough_fresh_matches(tmp_path):
+    fresh = [document(f"https://nice.org.uk/{i}", "Meniscal tear", "meniscal tear guidance") for i in range(3)]
+    stale = [document(f"https://old.org/{i}", "Meniscal tear", "meniscal tear guidance", age_days=60) for i in range(3)]
+    corpus = build(tmp_path, fresh + stale)
+    try:
+        outcome, results = corpus.evidence("meniscal tear", min_documents=3, max_age_seconds=30 * 24 * 3600)
+        assert outcome == 'hit' and len(results) == 3
+        assert all(result['url'].startswith("https://nice.org.uk/") for result in results)
+
+        assert corpus.evidence("meniscal tear", min_documents=4)[0] == 'stale'
+        assert corpus.evidence("pulmonary embolism", min_documents=1)[0] == 'miss'
+    finally:
+        corpus.close()
+
+
+def test_missing_corpus_loads_as_none(tmp_path):
+    assert GuidelineCorpus.load(str(tmp_path / 'absent')) is None
@@ -0,0 +1,120 @@
+import pytest
+
+from findings import (LocalFindingExtractor, canonicalize_finding, finding_terms, merge_duplicate_findings,
+                      normalize_finding)
+
+DISTINCT_PAIRS = [
+    ("Left femoral neck fracture", "Right femoral neck fracture"),
+    ("Grade 2 MCL sprain", "Grade 3 MCL sprain"),
+    ("Complete supraspinatus tear", "Partial supraspinatus tear"),
+    ("Medial meniscal tear", "Lateral meniscal tear"),
+    ("L4/5 disc protrusion", "L5/S1 disc protrusion"),
+    ("Possible metastasis", "Metastasis"),
+]
+
+
+@pytest.mark.parametrize("first,second", DISTINCT_PAIRS)
+def test_merge_keeps_findings_differing_in_a_decisive_token(first, second):
+    assert merge_duplicate_findings([first, second]) == [first, second]
+
+
+@pytest.mark.parametrize("first,second", [
+    ("Partial tear of the ACL", "ACL partial tear"),
+    ("Tear of the medial meniscus", "Medial meniscal tear"),
+    ("Small joint effusion", "Small joint effusions"),
+])
+def test_merge_drops_rephrased_duplicates_keeping_first_wording(first, second):
+    assert merge_duplicate_findings([first, second]) == [first]
+
+
+def test_merge_keeps_report_order():
+    findings = ["Small joint effusion", "Left femoral neck fracture", "Small joint effusions",
+                "Right femoral neck fracture"]
+    assert merge_duplicate_findings(findings) == [
+        "Small joint effusion", "Left femoral neck fracture", "Right femoral neck fracture"
+    ]
+
+
+def test_canonical_key_ignores_word_order_and_abbreviations():
+    assert canonicalize_finding("Partial tear of the ACL") == canonicalize_finding("anterior cruciate ligament partial tear")
+
+
+@pytest.mark.parametrize("hedged,plain", [
+    ("Heterogenous signal of the ACL, likely partial tear", "Heterogenous signal of the ACL, partial tear"),
+    ("Possible metastasis", "Metastasis"),
+])
+def test_canonical_key_keeps_certainty(hedged, plain):
+    assert canonicalize_finding(hedged) != canonicalize_finding(plain)
+
+
+def test_search_terms_drop_certainty_hedges():
+    assert finding_terms("Possible metastasis") == finding_terms("Metastasis") == ['metastasis']
+
+
+def test_normalized_text_keeps_order_certainty_and_laterality():
+    assert normalize_finding("Tear of the medial meniscus.") == normalize_finding("tear of medial meniscal")
+    assert normalize_finding("Likely partial tear") != normalize_finding("Partial tear")
+    assert normalize_finding("Medial condyle edema, lateral meniscal tear") != \
+        normalize_finding("Lateral condyle edema, medial meniscal tear")
+
+
+@pytest.fixture
+def extractor():
+    return LocalFindingExtractor()
+
+
+@pytest.mark.parametrize("sentence", [
+    "No fracture of the distal radius.",
+    "Negative for joint effusion in the suprapatellar recess.",
+    "A meniscal tear is not seen on the sagittal images.",
+    "Fracture of the scaphoid waist has been ruled out.",
+])
+def test_negated_findings_are_not_extracted(extractor, sentence):
+    extraction = extractor.extract(sentence)
+    assert extraction.findings == []
+    assert not extraction.confident   # Nothing positive to report still goes to the LLM
+
+
+@pytest.mark.parametrize("sentence", [
+    "No evidence of fracture, but there is a large joint effusion.",
+    "No evidence of fracture, though there is a large joint effusion.",
+    "No evidence of fracture, while there is a large joint effusion.",
+    "No evidence of fracture, whereas there is a large joint effusion.",
+])
+def test_terminator_ends_the_negation_scope(extractor, sentence):
+    assert extractor.extract(sentence).findings == [sentence.rstrip('.')]
+
+
+def test_post_negation_covers_terms_before_it_only_back_to_a_terminator(extractor):
+    sentence = "Large joint effusion noted, however a meniscal tear is not identified"
+    assert extractor.extract(sentence + ".").findings == [sentence]
+
+
+def test_terms_match_plural_suffixes_but_not_other_words(extractor):
+    assert extractor.extract("Multiple small joint effusions are present.").findings
+    assert extractor.extract("Several soft tissue masses in the thigh.").findings
+    assert extractor.extract("Patient referred by the massage therapist.").findings == []
+
+
+def test_decimal_points_do_not_split_sentences(extractor):
+    extraction = extractor.extract("There is a 1.5cm ganglion cyst posterior to the joint. Ligaments are intact.")
+    assert extraction.findings == ["There is a 1.5cm ganglion cyst posterior to the joint"]
+    assert extraction.confident
+
+
+def test_unexplained_sentence_makes_extraction_unconfident(extractor):
+    report = "There is a 1.5cm ganglion cyst posterior to the joint. The popliteal vessels appear normal."
+    assert extractor.extract(report).confident
+    report = "There is a 1.5cm ganglion cyst posterior to the joint. Postoperative appearances at the ACL graft."
+    extraction = extractor.extract(report)
+    assert extraction.findings and not extraction.confident
+
+
+def test_long_or_crowded_reports_are_not_confident():
+    report = " ".join(f"Fracture of rib number {rib} is seen." for rib in range(1, 5))
+    assert LocalFindingExtractor(max_findings=5).extract(report).confident
+
+    extraction = LocalFindingExtractor(max_findings=3).extract(report)
+    assert len(extraction.findings) == 3 and not extraction.confident
+
+    assert not LocalFindingExtractor(max_confident_chars=len(report) - 1).extract(report).confident
@@ -0,0 +1,80 @@
+import time
+
+from providers import (CircuitBreaker, deadline_bound, remaining_time, report_deadline, request_deadline,
+                       retry_after_seconds)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()   # Only one probe at a time
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_nested_deadline_never_extends_the_outer_one():
+    assert remaining_time() is None
+    with request_deadline(1.0):
+        with request_deadline(60.0):
+            assert remaining_time() <= 1.0
+        with request_deadline(None):
+            assert remaining_time() <= 1.0
+    assert remaining_time() is None
+
+
+def test_retry_after_accepts_seconds_and_ignores_garbage():
+    assert retry_after_seconds({'Retry-After': '2.5'}) == 2.5
+    assert retry_after_seconds({'Retry-After': 'soon'}) is None
+    assert retry_after_seconds({}) is None
+
+
+class Pipeline:
+    request_deadline_seconds = 180.0
+
+    @deadline_bound
+    def generate_report(self):
+        return remaining_time()
+
+
+def test_report_deadline_overrides_the_pipeline_setting():
+    assert 179 < Pipeline().generate_report() <= 180
+    with report_deadline(1800.0):
+        assert Pipeline().generate_report() > 1700
+    with report_deadline(None):
+        assert Pipeline().generate_report() is None
@@ -0,0 +1,207 @@
+import pytest
+import requests
+
+from providers import request_deadline
+from radiology_ai import RECOMMENDATIONS_API_ERROR, RECOMMENDATIONS_SYSTEM_ERROR
+from result_index import QUERY_FAILED, QUERY_OK, QUERY_REJECTED, ResultIndex
+
+
+def nice_results(query_position, count=2):
+    return [{'url': f"https://www.nice.org.uk/guidance/{query_position}-{rank}", 'title': f"Guidance {query_position}",
+             'content': f"recommendation {query_position} {rank}"} for rank in range(count)]
+
+
+def test_complete_evidence_is_cached(ai):
+    index = ResultIndex()
+    for position in range(3):
+        index.add_query_results(position, nice_results(position))
+
+    evidence = ai._compile_evidence("Medial meniscal tear", index, total_queries=3)
+
+    assert evidence['queries_run'] == 3 and evidence['queries_failed'] == 0 and not evidence['trimmed']
+    assert ai._cached_evidence("Medial meniscal tear") is not None
+
+
+def test_evidence_with_failed_or_rejected_queries_is_not_cached(ai):
+    index = ResultIndex()
+    index.add_query_results(0, nice_results(0))
+    index.add_query_results(1, [], QUERY_FAILED)
+    for position in range(2, 20):
+        index.add_query_results(position, [], QUERY_REJECTED)
+
+    evidence = ai._compile_evidence("Medial meniscal tear", index, total_queries=20)
+
+    assert evidence['queries_run'] == 1
+    assert evidence['queries_failed'] == 19
+    assert evidence['queries_skipped'] == 0
+    assert evidence['total_sources'] == 2
+    assert ai._cached_evidence("Medial meniscal tear") is None
+
+
+def test_plan_cut_short_without_sufficient_evidence_is_trimmed(ai):
+    index = ResultIndex()
+    index.add_query_results(0, nice_results(0, count=1))
+
+    evidence = ai._compile_evidence("Medial meniscal tear", index, total_queries=20)
+
+    assert evidence['trimmed'] and evidence['queries_skipped'] == 19
+    assert ai._cached_evidence("Medial meniscal tear") is None
+
+
+def test_query_plan_counts_each_outcome(ai, monkeypatch):
+    outcomes = {0: QUERY_OK, 1: QUERY_FAILED, 2: QUERY_REJECTED}
+    ai.sufficient_tier1_sources = None
+    ai.sufficient_guideline_sources = None
+    monkeypatch.setattr(ai, '_search_query', lambda query, index, total: (
+        outcomes[index - 1], nice_results(index - 1) if outcomes[index - 1] == QUERY_OK else []
+    ))
+
+    index = ai._run_query_plan(["q1", "q2", "q3"])
+
+    assert (index.queries_run, index.queries_failed, index.queries_rejected) == (1, 1, 1)
+    assert index.queries_issued == 3
+
+
+@pytest.fixture
+def incremental(ai, monkeypatch):
+    """Run generate_incremental_report on given findings, recording which findings were processed"""
+    processed = []
+    failures = {}   # Finding -> changes applied to its result, simulating a failed or degraded run
+
+    def run(findings, report_id="ACC-1"):
+        processed.clear()
+        monkeypatch.setattr(ai, 'extract_key_findings', lambda report: list(findings))
+        return ai.generate_incremental_report(report_id, "report text")
+
+    def process(findings):
+        processed.extend(findings)
+        results = []
+        for finding in findings:
+            result = {'finding': finding, 'evidence': {'results': [], 'total_sources': 0},
+                      'recommendations': f"recommendations for {finding}", 'evidence_strength': 'WEAK'}
+            failure = failures.get(finding, {})
+            result['evidence'].update(failure.get('evidence', {}))
+            result.update({key: value for key, value in failure.items() if key != 'evidence'})
+            results.append(result)
+        return results
+
+    monkeypatch.setattr(ai, '_process_findings', process)
+    run.processed = processed
+    run.failures = failures
+    return run
+
+
+def counts(result):
+    return result['findings_reused'], result['findings_rerun'], result['findings_removed']
+
+
+def test_unchanged_findings_are_reused(incremental):
+    findings = ["Medial meniscal tear", "Small joint effusion"]
+    assert counts(incremental(findings)) == (0, 2, 0)
+
+    result = incremental(findings)
+    assert counts(result) == (2, 0, 0)
+    assert incremental.processed == []
+    assert "recommendations for Small joint effusion" in result['analysis']
+
+
+def test_addendum_reruns_only_added_findings_and_drops_removed_ones(incremental):
+    incremental(["Medial meniscal tear", "Small joint effusion"])
+
+    result = incremental(["Medial meniscal tear.", "Bone bruise of the lateral femoral condyle"])
+    assert counts(result) == (1, 1, 1)
+    assert incremental.processed == ["Bone bruise of the lateral femoral condyle"]
+
+
+def test_certainty_only_amendment_is_rerun(incremental):
+    incremental(["Heterogenous signal of the ACL, likely partial tear"])
+
+    result = incremental(["Heterogenous signal of the ACL, partial tear"])
+    assert counts(result) == (0, 1, 1)
+    assert "recommendations for Heterogenous signal of the ACL, partial tear" in result['analysis']
+    assert "likely partial tear" not in result['analysis']
+
+
+def test_laterality_swap_is_rerun(incremental):
+    incremental(["Medial condyle edema with lateral meniscal tear"])
+    assert counts(incremental(["Lateral condyle edema with medial meniscal tear"])) == (0, 1, 1)
+
+
+def test_reports_do_not_share_stored_results(incremental):
+    incremental(["Medial meniscal tear"], report_id="ACC-1")
+    assert counts(incremental(["Medial meniscal tear"], report_id="ACC-2")) == (0, 1, 0)
+
+
+@pytest.mark.parametrize("failure", [
+    {'recommendations': RECOMMENDATIONS_API_ERROR},
+    {'recommendations': RECOMMENDATIONS_SYSTEM_ERROR},
+    {'evidence': {'queries_failed': 3}},
+    {'evidence': {'trimmed': True}},
+    {'evidence': {'search_failed': True}},
+])
+def test_failed_results_are_rerun_until_they_succeed(incremental, failure):
+    findings = ["Medial meniscal tear", "Small joint effusion"]
+    incremental.failures["Medial meniscal tear"] = failure
+    assert counts(incremental(findings)) == (0, 2, 0)
+
+    incremental.failures.clear()
+    result = incremental(findings)
+    assert counts(result) == (1, 1, 0)
+    assert incremental.processed == ["Medial meniscal tear"]
+    assert "recommendations for Medial meniscal tear" in result['analysis']
+
+    assert counts(incremental(findings)) == (2, 0, 0)
+
+
+@pytest.mark.parametrize("finding,mirrored", [
+    ("Medial condyle edema with lateral meniscal tear", "Lateral condyle edema with medial meniscal tear"),
+    ("Left knee effusion, right hip fracture", "Right knee effusion, left hip fracture"),
+])
+def test_mirrored_findings_do_not_share_evidence(ai, finding, mirrored):
+    assert ai._evidence_cache_key(finding) != ai._evidence_cache_key(mirrored)
+
+    index = ResultIndex()
+    index.add_query_results(0, nice_results(0))
+    ai._compile_evidence(finding, index, total_queries=1)
+    assert ai._cached_evidence(finding) is not None
+    assert ai._cached_evidence(mirrored) is None
+
+
+def test_rewording_by_case_and_punctuation_still_shares_evidence(ai):
+    assert ai._evidence_cache_key("Medial meniscal tear.") == ai._evidence_cache_key("medial meniscus tear")
+
+
+def test_lean_search_requests_skip_generated_answers_and_raw_content(ai):
+    request = ai._build_tavily_request("meniscal tear NICE guidelines")
+    assert request['include_answer'] is False and request['include_raw_content'] is False
+
+    ai.lean_results = False
+    request = ai._build_tavily_request("meniscal tear NICE guidelines")
+    assert request['include_answer'] is True and request['include_raw_content'] is True
+
+
+class TimingOutSession:
+    def __init__(self):
+        self.timeouts = []
+
+    def post(self, url, headers, json, timeout):
+        self.timeouts.append(timeout)
+        raise requests.Timeout("read timed out")
+
+
+def test_only_full_length_timeouts_count_against_the_provider(ai, monkeypatch):
+    session = TimingOutSession()
+    monkeypatch.setattr(ai.http, 'session', lambda provider: session)
+    ai.max_retries = 0
+    breaker = ai.http.breaker('tavily')
+
+    with request_deadline(1.0):
+        with pytest.raises(requests.Timeout):
+            ai._post('tavily', "https://api.tavily.com/search", {}, {})
+    assert session.timeouts[-1][1] <= 1.0
+    assert breaker.failures == 0
+
+    with pytest.raises(requests.Timeout):
+        ai._post('tavily', "https://api.tavily.com/search", {}, {})
+    assert session.timeouts[-1] == ai.http.timeout('tavily')
+    assert breaker.failures == 1
@@ -0,0 +1,30 @@
+from result_index import ResultIndex, canonicalize_url
+
+
+def test_canonical_url_lowercases_only_scheme_and_host():
+    assert canonicalize_url("HTTPS://WWW.Example.ORG/Guidance/NG226/") == "example.org/Guidance/NG226"
+    assert canonicalize_url("https://example.org/Page") != canonicalize_url("https://example.org/page")
+    assert canonicalize_url("https://doi.org/10.1002/JMRI.27845") == "doi.org/10.1002/JMRI.27845"
+
+
+def test_canonical_url_strips_only_tracking_parameters():
+    url = "https://journal.org/article?utm_source=feed&fbclid=abc&gclid=def&source=ajr&ref=12&id=7#section"
+    assert canonicalize_url(url) == "journal.org/article?id=7&ref=12&source=ajr"
+
+
+def test_canonical_url_merges_ncbi_aliases():
+    assert canonicalize_url("https://www.ncbi.nlm.nih.gov/pmc/articles/PMC123456/") == \
+        canonicalize_url("https://pmc.ncbi.nlm.nih.gov/articles/PMC123456") == \
+        "pmc.ncbi.nlm.nih.gov/articles/PMC123456"
+    assert canonicalize_url("https://www.ncbi.nlm.nih.gov/pubmed/998877") == "pubmed.ncbi.nlm.nih.gov/998877"
+
+
+def test_index_keeps_case_distinct_pages_and_collapses_tracking_copies():
+    index = ResultIndex()
+    index.add_query_results(0, [
+        {'url': "https://example.org/Guide?utm_medium=x", 'title': "Guide A", 'content': "alpha"},
+        {'url': "https://example.org/guide", 'title': "Guide B", 'content': "beta"},
+    ])
+    index.add_query_results(1, [{'url': "https://www.example.org/Guide/", 'title': "Guide A", 'content': "alpha"}])
+    assert [result['title'] for result in index.results()] == ["Guide A", "Guide B"]
+    assert index.duplicates == 1
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import pytest
+
+from scheduler import (BATCH, EXTRACTION, INTERACTIVE, SEARCH, Flow, ProviderQuota, ProviderScheduler,
+                       request_priority, use_flow)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = ProviderScheduler(quotas={'tavily': ProviderQuota(requests_per_second=50.0, burst=1)})
+    yield scheduler
+    scheduler.close()
+
+
+def grant_order(scheduler, calls):
+    """Queue (label, request class, flow, stage) calls behind an empty bucket; labels in the order granted"""
+    granted = []
+
+    async def call(label, request_class, flow, stage):
+        with request_priority(request_class), use_flow(flow):
+            await scheduler.acquire_async('tavily', stage)
+        granted.append(label)
+
+    async def main():
+        await scheduler.acquire_async('tavily')   # Drain the burst so every call below queues
+        await asyncio.gather(*(call(*spec) for spec in calls))
+
+    asyncio.run(main())
+    return granted
+
+
+def test_interactive_before_batch_and_extraction_before_search(scheduler):
+    calls = [
+        ('batch search', BATCH, None, SEARCH),
+        ('interactive search', INTERACTIVE, None, SEARCH),
+        ('interactive extraction', INTERACTIVE, None, EXTRACTION),
+        ('batch extraction', BATCH, None, EXTRACTION),
+    ]
+    assert grant_order(scheduler, calls) == [
+        'interactive extraction', 'interactive search', 'batch extraction', 'batch search'
+    ]
+
+
+def test_reports_share_the_queue_fairly(scheduler):
+    large, small = Flow(), Flow()
+    calls = [('large 1', INTERACTIVE, large, SEARCH), ('large 2', INTERACTIVE, large, SEARCH),
+             ('large 3', INTERACTIVE, large, SEARCH), ('small 1', INTERACTIVE, small, SEARCH)]
+    assert grant_order(scheduler, calls) == ['large 1', 'small 1', 'large 2', 'large 3']
+
+
+def test_request_rate_is_limited_after_the_burst():
+    scheduler = ProviderScheduler(quotas={'tavily': ProviderQuota(requests_per_second=20.0, burst=2)})
+    try:
+        started = time.monotonic()
+        for _ in range(6):
+            scheduler.acquire('tavily')
+        # Two calls go straight away, the other four wait 1/20 s each
+        assert time.monotonic() - started >= 0.18
+    finally:
+        scheduler.close()
+
+
+def test_token_budget_delays_large_prompts():
+    scheduler = ProviderScheduler(quotas={
+        'groq': ProviderQuota(requests_per_second=100.0, burst=10, tokens_per_minute=600)
+    })
+    try:
+        scheduler.acquire('groq', EXTRACTION, tokens=600)
+        started = time.monotonic()
+        scheduler.acquire('groq', EXTRACTION, tokens=5)   # 10 tokens/s refill
+        assert time.monotonic() - started >= 0.4
+    finally:
+        scheduler.close()
+
+
+def test_zero_rate_disables_scheduling():
+    scheduler = ProviderScheduler(quotas={'tavily': ProviderQuota(requests_per_second=0)})
+    started = time.monotonic()
+    for _ in range(100):
+        scheduler.acquire('tavily')
+    assert time.monotonic() - started < 0.1
+    assert scheduler.queue_depths() == {}
+    scheduler.close()